@@ -3,10 +3,12 @@ from xin.bb.model_util.model import BaseDocument, Marshallable
 from xin.bb.model_util.controller import ControlledDocument, BaseController
 from xin.bb.model_util.searcher import BaseSolrSearcher, Searcher, SearchableDocument
 from xin.bb.model_util.version import VersionedDocument, HistorizedDocument
+from xin.bb.model_util.queryset import DocumentQuerySet, ReadOnlyDocument
 from xin.bb.model_util import fields
 
 
 __all__ = ('Document', 'DynamicDocument',
            'BaseDocument', 'ControlledDocument', 'BaseController', 'fields',
            'BaseSolrSearcher', 'Searcher', 'SearchableDocument', 'Marshallable',
-           'HistorizedDocument', 'VersionedDocument')
+           'HistorizedDocument', 'VersionedDocument', 'DocumentQuerySet',
+           'ReadOnlyDocument')
@@ -0,0 +1,441 @@
+"""
+Micro-benchmarks of the searcher, without mongo nor solr
+
+``solr_doc`` compares the compiled solr document builder
+(``generate_solr_doc``) with merging the output of each converter's
+``build_solr``, for documents of the given numbers of fields.
+
+``fetch`` compares ``fetch_documents`` (single query indexed by pk) with
+reordering the results through a nested loop over the solr hits and the
+queryset, for result pages of the given sizes. Mongo is simulated by a
+queryset adding a latency to each query it runs::
+
+    python -m xin.bb.model_util.benchmark --fields 10 20 30 --sizes 20 100 500
+
+``read_only`` compares the memory kept (measured with ``tracemalloc``) and
+the build time of :class:`ReadOnlyDocument` with the documents built by
+``_from_son``, out of the raw BSON of 1000 documents of the given numbers
+of fields. ``read_only_read`` is the memory once all the fields have been
+read.
+
+``hooks`` compares, for a ``HistorizedDocument`` of the given numbers of
+fields, the hooks resolved once per class with the previous bootstrap run
+by each document's ``__init__`` (one signal receiver per hook): time of
+``_from_son`` and of the ``pre_save``/``post_save`` signals sent by a
+save (history items are built but not written).
+
+``history`` compares the storage (BSON size) of the history items of a
+document of the given numbers of fields over a run of saves, each
+changing two fields, when stored as a snapshot every
+``--snapshot-interval`` versions plus deltas or as full contents only.
+
+Reports for each scenario the time (or memory) per document (or per page)
+of both implementations and the speedup.
+"""
+import gc
+import sys
+import json
+import time
+import random
+import timeit
+import argparse
+import tracemalloc
+from datetime import datetime
+
+import mongoengine
+from mongoengine import fields
+from bson import BSON, ObjectId
+
+from xin.bb.model_util.searcher import BaseSolrSearcher, get_solr_doc_id
+from xin.bb.model_util.queryset import ReadOnlyDocument
+from xin.bb.model_util.version import HistorizedDocument, _json_patch
+
+
+class Reference:
+
+    def __init__(self, id):
+        self.id = id
+
+
+# Typical field kinds of a document with a random value generator
+FIELD_KINDS = (
+    (fields.StringField, lambda rand: rand.choice(('', 'value', 'other value', None))),
+    (fields.IntField, lambda rand: rand.randint(0, 1000)),
+    (fields.BooleanField, lambda rand: rand.random() < 0.5),
+    (fields.DateTimeField, lambda rand: datetime(2016, 1, 1, rand.randint(0, 23))),
+    (lambda: fields.ListField(fields.StringField()),
+     lambda rand: [rand.choice('abcdef') for _ in range(rand.randint(0, 5))]),
+    (lambda: fields.ReferenceField('BenchDocument'), lambda rand: Reference(rand.randint(1, 100))),
+)
+
+
+class BenchDocument:
+
+    _class_name = 'BenchDocument'
+
+    def __init__(self, rand, generators):
+        self.pk = self.id = rand.randint(1, 10 ** 6)
+        self.doc_version = rand.randint(1, 10)
+        self.doc_updated = self.doc_created = datetime(2016, 1, 1)
+        for name, generate in generators:
+            setattr(self, name, generate(rand))
+
+
+def build_solr_doc_scenario(field_count, rand):
+    """Return a searcher and its documents with ``field_count`` fields"""
+    searcher = BaseSolrSearcher(BenchDocument)
+    generators = []
+    for i in range(field_count):
+        field_cls, generate = FIELD_KINDS[i % len(FIELD_KINDS)]
+        name = 'field_%s' % i
+        searcher.build_and_register_converter(name, field_cls())
+        generators.append((name, generate))
+    documents = [BenchDocument(rand, generators) for _ in range(100)]
+    return searcher, documents
+
+
+def merge_solr_doc(searcher, document):
+    """Previous implementation, merging the dict built by each converter"""
+    sdoc = {'id': get_solr_doc_id(document)}
+    for c in searcher.converters:
+        sdoc.update(c.build_solr(document))
+    return sdoc
+
+
+def run_solr_doc(field_count, repeat, rand):
+    searcher, documents = build_solr_doc_scenario(field_count, rand)
+    for document in documents:
+        assert searcher.generate_solr_doc(document) == merge_solr_doc(searcher, document)
+
+    def compiled():
+        for document in documents:
+            searcher.generate_solr_doc(document)
+
+    def merged():
+        for document in documents:
+            merge_solr_doc(searcher, document)
+
+    count = repeat * len(documents)
+    report = {
+        'fields': field_count,
+        'compiled': min(timeit.repeat(compiled, number=repeat, repeat=3)) / count,
+        'merged': min(timeit.repeat(merged, number=repeat, repeat=3)) / count,
+    }
+    report['speedup'] = report['merged'] / report['compiled']
+    return report
+
+
+class FakeQuerySet:
+
+    """Queryset running a query (i.e. waiting ``latency``) on each iteration"""
+
+    def __init__(self, documents, latency):
+        self.documents = documents
+        self.latency = latency
+        self.queries = 0
+
+    def __iter__(self):
+        self.queries += 1
+        if self.latency:
+            time.sleep(self.latency)
+        return iter(self.documents)
+
+
+def build_fetch_scenario(size, latency, rand):
+    """Return a searcher and the solr ``doc_id`` of a page of ``size`` results"""
+    documents = [BenchDocument(rand, ()) for _ in range(size)]
+    # Mongo returns the documents in its own order
+    queryset = FakeQuerySet(rand.sample(documents, size), latency)
+
+    class FetchDocument(BenchDocument):
+
+        @staticmethod
+        def objects(pk__in):
+            return queryset
+
+    return BaseSolrSearcher(FetchDocument), [str(d.pk) for d in documents], queryset
+
+
+def nested_loop_fetch(searcher, doc_ids):
+    """Previous implementation, walking the queryset for each solr hit"""
+    items = searcher.document_cls.objects(pk__in=doc_ids)
+    ordered_items = []
+    for doc_id in doc_ids:
+        for item in items:
+            if str(item.pk) == doc_id:
+                ordered_items.append(item)
+    return ordered_items
+
+
+def run_fetch(size, repeat, latency, rand):
+    searcher, doc_ids, queryset = build_fetch_scenario(size, latency, rand)
+    assert searcher.fetch_documents(doc_ids) == nested_loop_fetch(searcher, doc_ids)
+    report = {'size': size}
+    for name, fetch in (('indexed', lambda: searcher.fetch_documents(doc_ids)),
+                        ('nested', lambda: nested_loop_fetch(searcher, doc_ids))):
+        queryset.queries = 0
+        report[name] = min(timeit.repeat(fetch, number=repeat, repeat=3)) / repeat
+        report[name + '_queries'] = queryset.queries // (repeat * 3)
+    report['speedup'] = report['nested'] / report['indexed']
+    return report
+
+
+def build_document_cls(name, bases, field_count, rand, meta=None):
+    """
+    Return a mongoengine document class inheriting ``bases`` with
+    ``field_count`` fields, and a generator of their random values
+    """
+    attrs = {'meta': meta or {}}
+    generators = []
+    # References are left out, they point to the fake BenchDocument
+    kinds = FIELD_KINDS[:-1]
+    for i in range(field_count):
+        field_cls, generate = kinds[i % len(kinds)]
+        name_i = 'field_%s' % i
+        attrs[name_i] = field_cls()
+        generators.append((name_i, generate))
+    document_cls = type(bases[-1])(name, bases, attrs)
+
+    def generate_values():
+        return {name_i: generate(rand) for name_i, generate in generators}
+
+    return document_cls, generate_values
+
+
+def measure_memory(build, raws):
+    """Memory kept per object built out of the raw BSON documents"""
+    gc.collect()
+    tracemalloc.start()
+    try:
+        start = tracemalloc.get_traced_memory()[0]
+        objects = [build(BSON(raw).decode()) for raw in raws]
+        size = tracemalloc.get_traced_memory()[0] - start
+    finally:
+        tracemalloc.stop()
+    del objects
+    return size / len(raws)
+
+
+def run_read_only(field_count, repeat, rand):
+    document_cls, generate_values = build_document_cls(
+        'ReadOnlyBench%s' % field_count, (mongoengine.Document, ), field_count, rand)
+    sons = [document_cls(id=ObjectId(), **generate_values()).to_mongo() for _ in range(1000)]
+    raws = [BSON.encode(son) for son in sons]
+    field_names = list(document_cls._fields)
+
+    def read_only(son):
+        return ReadOnlyDocument(document_cls, son)
+
+    def read_only_read(son):
+        doc = ReadOnlyDocument(document_cls, son)
+        for name in field_names:
+            getattr(doc, name)
+        return doc
+
+    doc = read_only(sons[0])
+    assert all(getattr(doc, name) == getattr(doc.to_document(), name) for name in field_names)
+    report = {
+        'fields': field_count,
+        'read_only_memory': measure_memory(read_only, raws),
+        'read_only_read_memory': measure_memory(read_only_read, raws),
+        'document_memory': measure_memory(document_cls._from_son, raws),
+    }
+    repeat = max(1, repeat // 10)
+    count = repeat * len(sons)
+    for name, build in (('read_only', read_only), ('document', document_cls._from_son)):
+        report[name] = min(timeit.repeat(
+            lambda: [build(son) for son in sons], number=repeat, repeat=3)) / count
+    report['memory_ratio'] = report['document_memory'] / report['read_only_memory']
+    report['speedup'] = report['document'] / report['read_only']
+    return report
+
+
+class NullHistoryWriter:
+
+    def write(self, item):
+        pass
+
+
+class LegacyHooksMixin:
+
+    """Previous hooks, bootstrapped on each document construction"""
+
+    @classmethod
+    def _bootstrap_hooks(cls):
+        cls._meta['_legacy_bootstrapped'] = False
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        cls = type(self)
+        # VersionedDocument._bootstrap_version
+        if not cls._meta['_legacy_bootstrapped']:
+            cls._meta['_legacy_bootstrapped'] = True
+            mongoengine.signals.pre_save.connect(cls._version_pre_save, sender=cls)
+            mongoengine.signals.post_save.connect(cls._history_post_save, sender=cls)
+            mongoengine.signals.post_delete.connect(cls._history_post_delete, sender=cls)
+        # HistorizedDocument.__init__
+        self._history_cls = self._bootstrap_history_cls()
+        self.get_history = lambda *args, **kwargs: \
+            self._history_cls.objects(*args, origin=self, **kwargs).order_by('version')
+
+
+def run_hooks(field_count, repeat, rand):
+    # Same field values for both documents
+    seed = rand.random()
+    report = {'fields': field_count}
+    for name, bases in (('hooked', (HistorizedDocument, )),
+                        ('legacy', (LegacyHooksMixin, HistorizedDocument))):
+        document_cls, generate_values = build_document_cls(
+            '%sHooksBench%s' % (name.capitalize(), field_count), bases, field_count,
+            random.Random(seed), meta={'history_writer': NullHistoryWriter()})
+        sons = [document_cls(id=ObjectId(), **generate_values()).to_mongo()
+                for _ in range(100)]
+        documents = [document_cls._from_son(son) for son in sons]
+
+        def construct():
+            for son in sons:
+                document_cls._from_son(son)
+
+        def save_signals():
+            # What a save does around the actual mongo update
+            for document in documents:
+                mongoengine.signals.pre_save.send(document_cls, document=document)
+                document._delta()
+                mongoengine.signals.post_save.send(document_cls, document=document,
+                                                   created=False)
+
+        save_signals()
+        assert all(document.doc_version == 2 for document in documents)
+        count = repeat * len(sons)
+        report[name + '_construct'] = min(timeit.repeat(
+            construct, number=repeat, repeat=3)) / count
+        report[name + '_save'] = min(timeit.repeat(
+            save_signals, number=repeat, repeat=3)) / count
+    report['construct_speedup'] = report['legacy_construct'] / report['hooked_construct']
+    report['save_speedup'] = report['legacy_save'] / report['hooked_save']
+    return report
+
+
+def run_history(field_count, saves, interval, rand):
+    document_cls, generate_values = build_document_cls(
+        'HistoryBench%s' % field_count, (HistorizedDocument, ), field_count, rand,
+        meta={'history_writer': NullHistoryWriter()})
+    son = document_cls(id=ObjectId(), **generate_values()).to_mongo()
+    changes = []
+    for _ in range(saves):
+        values = generate_values()
+        changes.append([(name, values[name]) for name in rand.sample(sorted(values), 2)])
+    report = {'fields': field_count, 'saves': saves, 'interval': interval}
+    for name, snapshot_interval in (('delta', interval), ('full', 1)):
+        document_cls._meta['history_snapshot_interval'] = snapshot_interval
+        document = document_cls._from_son(son)
+        items = [document_cls._build_history_item(document, True)]
+        for save_changes in changes:
+            for field, value in save_changes:
+                setattr(document, field, value)
+            # What a save does, see VersionedDocument.save
+            document_cls._version_pre_save(document_cls, document)
+            document._delta()
+            items.append(document_cls._build_history_item(document, False))
+            document._clear_changed_fields()
+        # The last version must be rebuilt out of the history
+        content = None
+        for item in items:
+            content = (json.loads(item.content) if item.content is not None else
+                       _json_patch(content, json.loads(item.delta)))
+        assert content == json.loads(document.to_json())
+        report[name] = sum(len(BSON.encode(item.to_mongo())) for item in items)
+    report['ratio'] = report['full'] / report['delta']
+    return report
+
+
+def print_report(scenario, report):
+    if scenario == 'solr_doc':
+        print('[BENCH] solr_doc   fields=%-4s compiled %6.1fus/doc  merged %6.1fus/doc  '
+              'x%.2f' % (report['fields'], report['compiled'] * 10 ** 6,
+                         report['merged'] * 10 ** 6, report['speedup']))
+    elif scenario == 'read_only':
+        print('[BENCH] read_only  fields=%-4s read only %6.0fB/doc (%6.0fB/doc once read) '
+              '%6.1fus/doc  document %6.0fB/doc %6.1fus/doc  memory x%.1f  time x%.1f' % (
+                  report['fields'], report['read_only_memory'],
+                  report['read_only_read_memory'], report['read_only'] * 10 ** 6,
+                  report['document_memory'], report['document'] * 10 ** 6,
+                  report['memory_ratio'], report['speedup']))
+    elif scenario == 'hooks':
+        print('[BENCH] hooks      fields=%-4s construct %6.1fus/doc (legacy %6.1fus/doc) x%.2f  '
+              'save %6.1fus/doc (legacy %6.1fus/doc) x%.2f' % (
+                  report['fields'], report['hooked_construct'] * 10 ** 6,
+                  report['legacy_construct'] * 10 ** 6, report['construct_speedup'],
+                  report['hooked_save'] * 10 ** 6, report['legacy_save'] * 10 ** 6,
+                  report['save_speedup']))
+    elif scenario == 'history':
+        print('[BENCH] history    fields=%-4s %s saves  snapshot every %s %8.1fKB  '
+              'full contents %8.1fKB  x%.1f' % (
+                  report['fields'], report['saves'], report['interval'],
+                  report['delta'] / 1024, report['full'] / 1024, report['ratio']))
+    else:
+        print('[BENCH] fetch      size=%-4s   indexed %8.2fms/page (%s queries)  '
+              'nested %8.2fms/page (%s queries)  x%.1f' % (
+                  report['size'], report['indexed'] * 1000, report['indexed_queries'],
+                  report['nested'] * 1000, report['nested_queries'], report['speedup']))
+
+
+SCENARIOS = ('solr_doc', 'fetch', 'read_only', 'hooks', 'history')
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--scenarios', nargs='+', default=list(SCENARIOS), choices=SCENARIOS)
+    parser.add_argument('--fields', type=int, nargs='+', default=[10, 20, 30],
+                        help='number of fields of the documents (all but fetch)')
+    parser.add_argument('--sizes', type=int, nargs='+', default=[20, 100, 500],
+                        help='number of results per page (fetch)')
+    parser.add_argument('--mongo-latency', type=float, default=0.5,
+                        help='simulated latency (in ms) of a mongo query (fetch)')
+    parser.add_argument('--repeat', type=int, default=100,
+                        help='number of runs over the 100 documents (solr_doc)')
+    parser.add_argument('--saves', type=int, default=200,
+                        help='number of saves of the document (history)')
+    parser.add_argument('--snapshot-interval', type=int, default=20,
+                        help='versions between two full snapshots (history)')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--json', help='also write the reports to this file')
+    args = parser.parse_args(argv)
+
+    rand = random.Random(args.seed)
+    reports = {}
+    if 'solr_doc' in args.scenarios:
+        for field_count in args.fields:
+            report = run_solr_doc(field_count, args.repeat, rand)
+            print_report('solr_doc', report)
+            reports['solr_doc-%s' % field_count] = report
+    if 'fetch' in args.scenarios:
+        for size in args.sizes:
+            # Nested loop is quadratic, keep large pages reasonably fast
+            repeat = max(1, 2000 // size)
+            report = run_fetch(size, repeat, args.mongo_latency / 1000, rand)
+            print_report('fetch', report)
+            reports['fetch-%s' % size] = report
+    if 'read_only' in args.scenarios:
+        for field_count in args.fields:
+            report = run_read_only(field_count, args.repeat, rand)
+            print_report('read_only', report)
+            reports['read_only-%s' % field_count] = report
+    if 'hooks' in args.scenarios:
+        for field_count in args.fields:
+            report = run_hooks(field_count, max(1, args.repeat // 10), rand)
+            print_report('hooks', report)
+            reports['hooks-%s' % field_count] = report
+    if 'history' in args.scenarios:
+        for field_count in args.fields:
+            report = run_history(field_count, args.saves, args.snapshot_interval, rand)
+            print_report('history', report)
+            reports['history-%s' % field_count] = report
+    if args.json:
+        with open(args.json, 'w') as fd:
+            json.dump(reports, fd, indent=2)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,252 @@
+import os
+import glob
+import fcntl
+import atexit
+import threading
+from bson import ObjectId, json_util
+from pymongo.errors import BulkWriteError
+from mongoengine.connection import get_db, DEFAULT_CONNECTION_NAME
+
+
+class BufferedHistoryWriter:
+
+    """
+    Queue the history items and insert them by batch, in their creation
+    order (thus preserving the order of each origin's history)
+
+    Use it as ``history_writer`` meta param of a :class:`HistorizedDocument`
+    (otherwise each history item is saved synchronously)::
+
+        history_writer = BufferedHistoryWriter(journal='/var/lib/myapp/history.journal')
+        history_writer.start()
+
+    The queue is flushed once ``max_size`` items are pending, every
+    ``flush_interval`` seconds by a background thread (if started), by
+    calling :meth:`flush` (e.g. at request teardown) and at exit.
+
+    If a ``journal`` path is provided, queued items are appended before
+    being acknowledged to a journal file of the process (``<journal>.<pid>``,
+    locked for its lifetime). Hence the path can be shared by several
+    worker processes. Once the process writes or flushes for the first
+    time, the journals left by dead processes (with the items they didn't
+    insert) are moved into its own and inserted by the next flush (or right
+    away by :meth:`recover`). The database doesn't need to be connected
+    when the writer is created.
+
+    .. note : Queued items are not visible to the history queries until
+        they are flushed
+    """
+
+    def __init__(self, max_size=500, flush_interval=1.0, journal=None):
+        self.max_size = max_size
+        self.flush_interval = flush_interval
+        self.journal = journal
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._queue = []
+        self._failed = False
+        self._journal_path = None
+        self._journal_pid = None
+        self._journal_fd = None
+        self._journal_lock_fd = None
+        self._thread = None
+        self._stop = threading.Event()
+        atexit.register(self.flush)
+
+    def __len__(self):
+        return len(self._queue)
+
+    def write(self, item):
+        """Queue a history item (``mongoengine.Document``) for insertion"""
+        item.validate()
+        son = item.to_mongo()
+        # Set the id now to make journal replay idempotent
+        son['_id'] = item.id = item.id or ObjectId()
+        entry = (item._meta.get('db_alias', DEFAULT_CONNECTION_NAME),
+                 item._get_collection_name(), son)
+        with self._lock:
+            self._check_journal()
+            if self._journal_fd:
+                self._journal_fd.write(json_util.dumps(entry) + '\n')
+                self._journal_fd.flush()
+            self._queue.append(entry)
+            full = len(self._queue) >= self.max_size
+        if full:
+            self.flush()
+
+    def flush(self):
+        """Insert all the queued items"""
+        with self._flush_lock:
+            with self._lock:
+                self._check_journal()
+                queue, self._queue = self._queue, []
+                if self._journal_fd and queue:
+                    self._rotate_journal()
+            try:
+                # After a failure, some items may have already been inserted
+                self._insert(queue, ignore_duplicates=self._failed)
+            except Exception:
+                # Keep the items for the next flush
+                with self._lock:
+                    self._queue = queue + self._queue
+                self._failed = True
+                raise
+            self._failed = False
+            if self._journal_path and os.path.exists(self._journal_path + '.flushing'):
+                os.remove(self._journal_path + '.flushing')
+
+    def _rotate_journal(self):
+        # New items go in a new journal while the queued ones are inserted
+        self._journal_fd.close()
+        flushing = self._journal_path + '.flushing'
+        if os.path.exists(flushing):
+            # Previous flush failed, its items are still queued
+            with open(flushing, 'a') as dst, open(self._journal_path) as src:
+                dst.write(src.read())
+            os.remove(self._journal_path)
+        else:
+            os.replace(self._journal_path, flushing)
+        self._journal_fd = open(self._journal_path, 'a')
+
+    def _check_journal(self):
+        # Called with the lock held, the journal is opened on first use by
+        # each process (e.g. workers forked after the writer's creation)
+        if not self.journal or self._journal_pid == os.getpid():
+            return
+        if self._journal_pid is not None:
+            # Forked process, the queued items belong to the parent
+            self._journal_fd.close()
+            self._journal_lock_fd.close()
+            self._queue = []
+            self._journal_pid = self._journal_fd = None
+        path = '%s.%s' % (self.journal, os.getpid())
+        self._journal_lock_fd = self._lock_journal(path)
+        if self._journal_lock_fd is None:
+            raise RuntimeError('History journal %s already used by another writer' %
+                               self.journal)
+        self._journal_pid = os.getpid()
+        self._journal_path = path
+        # Items left by a previous process with the same pid
+        self._queue = self._read_journal(self._journal_path)
+        self._journal_fd = open(self._journal_path, 'a')
+        self._queue += self._adopt_journals()
+        # Items may have been inserted before the previous processes died
+        self._failed = bool(self._queue)
+
+    @staticmethod
+    def _lock_journal(path):
+        # Return the locked lock file of the journal, None if already locked
+        lock_path = path + '.lock'
+        while True:
+            fd = open(lock_path, 'a')
+            try:
+                fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                fd.close()
+                return None
+            try:
+                if os.path.samestat(os.fstat(fd.fileno()), os.stat(lock_path)):
+                    return fd
+            except FileNotFoundError:
+                pass
+            # Removed meanwhile by the process adopting the journal, retry
+            fd.close()
+
+    def _adopt_journals(self):
+        # Move the items of the journals left by dead processes (i.e. not
+        # locked anymore) into this process' one
+        entries = []
+        for lock_path in sorted(glob.glob(glob.escape(self.journal) + '.*.lock')):
+            path = lock_path[:-len('.lock')]
+            if path == self._journal_path:
+                continue
+            lock_fd = self._lock_journal(path)
+            if lock_fd is None:
+                # Process still running
+                continue
+            adopted = self._read_journal(path)
+            for entry in adopted:
+                self._journal_fd.write(json_util.dumps(entry) + '\n')
+            self._journal_fd.flush()
+            for dead_path in (path + '.flushing', path, lock_path):
+                if os.path.exists(dead_path):
+                    os.remove(dead_path)
+            lock_fd.close()
+            entries += adopted
+        return entries
+
+    @staticmethod
+    def _insert(entries, ignore_duplicates=False):
+        # Group consecutive entries by collection to keep the global order
+        batch = []
+        for i, (alias, collection, son) in enumerate(entries):
+            batch.append(son)
+            if i + 1 == len(entries) or tuple(entries[i + 1][:2]) != (alias, collection):
+                try:
+                    get_db(alias)[collection].insert_many(batch, ordered=not ignore_duplicates)
+                except BulkWriteError as exc:
+                    errors = exc.details.get('writeErrors', ())
+                    if not ignore_duplicates or any(e['code'] != 11000 for e in errors):
+                        raise
+                batch = []
+
+    @classmethod
+    def _read_journal(cls, path):
+        entries = []
+        # Items of a failed flush come before the ones queued after it
+        for file_path in (path + '.flushing', path):
+            entries += cls._read_journal_file(file_path)
+        return entries
+
+    @staticmethod
+    def _read_journal_file(path):
+        entries = []
+        if not os.path.exists(path):
+            return entries
+        with open(path, 'rb+') as fd:
+            for line in iter(fd.readline, b''):
+                if not line.endswith(b'\n'):
+                    # The process died while writing this item (thus never
+                    # acknowledged it), drop it before appending to the file
+                    fd.truncate(fd.tell() - len(line))
+                    break
+                if line.strip():
+                    entries.append(tuple(json_util.loads(line.decode())))
+        return entries
+
+    def recover(self):
+        """
+        Insert now the queued items, including those of the journals left by
+        dead processes (otherwise inserted by the next flush)
+
+        :return: the number of inserted items
+        """
+        with self._lock:
+            self._check_journal()
+            count = len(self._queue)
+        self.flush()
+        return count
+
+    def start(self):
+        """Start the background thread flushing every ``flush_interval``"""
+        if self._thread:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name='history-writer', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """Stop the background thread and flush the remaining items"""
+        if self._thread:
+            self._stop.set()
+            self._thread.join()
+            self._thread = None
+        self.flush()
+
+    def _run(self):
+        while not self._stop.wait(self.flush_interval):
+            try:
+                self.flush()
+            except Exception as exc:
+                # Items are kept in the queue, retry on next tick
+                print('[HISTORY WRITER] Flush failed: %r' % exc)
@@ -3,6 +3,7 @@ from mongoengine import Document
 from xin.bb.model_util.version import HistorizedDocument
 from xin.bb.model_util.searcher import SearchableDocument
 from xin.bb.model_util.controller import ControlledDocument
+from xin.bb.model_util.queryset import DocumentQuerySet
 
 
 class Marshallable(Document):
@@ -29,5 +30,8 @@ class BaseDocument(ControlledDocument, Marshallable, HistorizedDocument,
 
     """
     Document default class, all actual documents should inherit from this one
+
+    Use ``MyDocument.objects.read_only()`` for read-only listings
+    (see :class:`DocumentQuerySet`)
     """
-    meta = {'abstract': True}
+    meta = {'abstract': True, 'queryset_class': DocumentQuerySet}
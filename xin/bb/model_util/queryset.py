@@ -0,0 +1,145 @@
+import mongoengine
+from mongoengine.base import get_document
+from mongoengine.errors import OperationError
+from mongoengine.queryset import QuerySetNoCache
+
+
+# Marks the fields missing from the mongo document
+_MISSING = object()
+# Document class -> (db fields, {field name: (index, field)})
+_read_only_layouts = {}
+
+
+def _get_read_only_layout(document_cls):
+    layout = _read_only_layouts.get(document_cls)
+    if layout is None:
+        names = tuple(document_cls._fields)
+        layout = (tuple(document_cls._fields[name].db_field for name in names),
+                  {name: (i, document_cls._fields[name]) for i, name in enumerate(names)})
+        _read_only_layouts[document_cls] = layout
+    return layout
+
+
+class ReadOnlyDocument:
+
+    """
+    Lightweight read-only view of a document loaded from mongo
+
+    Only keeps the raw mongo values of the document's fields (as a tuple,
+    the keys of the mongo document are not kept), fields are converted on
+    first access. None of the document machinery (change tracking, hooks,
+    validation...) is involved, use :meth:`to_document` to get the actual
+    document.
+
+    .. note : References are not dereferenced (as with ``no_dereference``)
+    """
+    __slots__ = ('_document_cls', '_son', '_values')
+
+    def __init__(self, document_cls, son):
+        if '_cls' in son:
+            document_cls = get_document(son['_cls'])
+        self._document_cls = document_cls
+        self._son = tuple(son.get(db_field, _MISSING)
+                          for db_field in _get_read_only_layout(document_cls)[0])
+        self._values = None
+
+    def __getattr__(self, name):
+        # Only called for attributes not in the slots, i.e. document fields
+        index, field = _get_read_only_layout(self._document_cls)[1].get(name, (None, None))
+        if field is None:
+            if name == 'pk':
+                return getattr(self, self._document_cls._meta['id_field'])
+            raise AttributeError("'%s' object has no attribute '%s'" % (
+                self._document_cls.__name__, name))
+        if self._values is None:
+            self._values = [_MISSING] * len(self._son)
+        else:
+            value = self._values[index]
+            if value is not _MISSING:
+                return value
+        raw = self._son[index]
+        if raw is not _MISSING:
+            value = field.to_python(raw)
+        else:
+            value = field.default() if callable(field.default) else field.default
+        self._values[index] = value
+        return value
+
+    def __repr__(self):
+        return '<%s (read only): %s>' % (self._document_cls.__name__, self.pk)
+
+    def to_document(self):
+        """Build the actual mongoengine document"""
+        son = {db_field: raw for db_field, raw in zip(
+            _get_read_only_layout(self._document_cls)[0], self._son) if raw is not _MISSING}
+        return self._document_cls._from_son(son)
+
+
+class ReadOnlyQuerySetMixin:
+
+    """
+    Provide :meth:`read_only` to both the caching and non caching querysets
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._read_only = False
+
+    def read_only(self):
+        """
+        Return :class:`ReadOnlyDocument` instead of documents, much cheaper
+        to build and to keep in memory for large read-only listings
+        """
+        queryset = self.clone()
+        queryset._read_only = True
+        return queryset
+
+    def clone_into(self, cls):
+        # Renamed ``_clone_into`` in newer mongoengine, override both names
+        parent = super()
+        clone_into = getattr(parent, '_clone_into', None) or parent.clone_into
+        cls = clone_into(cls)
+        cls._read_only = self._read_only
+        return cls
+
+    _clone_into = clone_into
+
+    def __next__(self):
+        # mongoengine is converted by 2to3, hence ``__next__`` instead of ``next``
+        if not self._read_only or self._as_pymongo or self._scalar:
+            return super().__next__()
+        # Newer mongoengine flags empty querysets with ``_empty`` instead of ``_limit == 0``
+        if self._none or getattr(self, '_empty', self._limit == 0):
+            raise StopIteration
+        return ReadOnlyDocument(self._document, next(self._cursor))
+
+    next = __next__
+
+    def __getitem__(self, key):
+        if (self._read_only and isinstance(key, int) and
+                not self._as_pymongo and not self._scalar):
+            queryset = self.clone()
+            return ReadOnlyDocument(self._document, queryset._cursor[key])
+        return super().__getitem__(key)
+
+
+class DocumentQuerySet(ReadOnlyQuerySetMixin, mongoengine.QuerySet):
+
+    """
+    Default queryset of :class:`BaseDocument`, providing :meth:`read_only`
+    """
+
+    def no_cache(self):
+        if self._result_cache is not None:
+            raise OperationError("QuerySet already cached")
+        return self.clone_into(DocumentQuerySetNoCache(self._document, self._collection))
+
+
+class DocumentQuerySetNoCache(ReadOnlyQuerySetMixin, QuerySetNoCache):
+
+    """
+    Non caching counterpart of :class:`DocumentQuerySet`
+    """
+
+    def cache(self):
+        return self.clone_into(DocumentQuerySet(self._document, self._collection))
@@ -0,0 +1,203 @@
+"""
+Full rebuild of the solr index of a searchable collection
+
+Can be run as a command::
+
+    python -m xin.bb.model_util.reindex myapp.model:MyDocument \\
+        --mongo mongodb://localhost:27017/mydb --solr http://localhost:8983/solr/core
+"""
+import time
+import multiprocessing
+from collections import namedtuple, deque
+from flask import current_app
+
+
+ReindexReport = namedtuple('ReindexReport', ('indexed', 'removed', 'last_id',
+                                             'elapsed', 'throughput'))
+
+
+# Per-process state of the solr document generation workers
+_worker = {}
+
+
+def _init_worker(document_cls, only_fields, setup):
+    if setup:
+        setup()
+    _worker['document_cls'] = document_cls
+    _worker['only_fields'] = only_fields
+    _worker['searcher'] = document_cls._search_bootstrap()
+
+
+def _generate_solr_docs(sons):
+    document_cls = _worker['document_cls']
+    only_fields = _worker['only_fields']
+    searcher = _worker['searcher']
+    sdocs = []
+    for son in sons:
+        document = document_cls._from_son(son, only_fields=only_fields)
+        sdocs.append(searcher.generate_solr_doc(document))
+    return sdocs
+
+
+def _iter_batches(queryset, batch_size):
+    batch = []
+    for son in queryset:
+        batch.append(son)
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def _pool_generate_solr_docs(pool, batches, max_pending):
+    # Bounded pipelining to avoid loading the whole collection in memory
+    # while the workers are busy, results are yielded in pk order
+    pending = deque()
+    for batch in batches:
+        pending.append((batch[-1]['_id'], pool.apply_async(_generate_solr_docs, (batch, ))))
+        if len(pending) >= max_pending:
+            last_id, result = pending.popleft()
+            yield last_id, result.get()
+    while pending:
+        last_id, result = pending.popleft()
+        yield last_id, result.get()
+
+
+def _remove_stale(document_cls, searcher, batch_size):
+    """
+    Remove from solr the documents of the collection that are no longer
+    in mongo, return the number of removed documents
+    """
+    id_field = document_cls._fields[document_cls._meta['id_field']]
+    removed = 0
+    for results in searcher.iter_solr_search('*:*', fl='id,doc_id', rows=batch_size):
+        sdocs = {d['doc_id']: d['id'] for d in results}
+        if not sdocs:
+            continue
+        pks = [id_field.to_python(doc_id) for doc_id in sdocs]
+        existing = {str(pk) for pk in document_cls.objects(pk__in=pks).scalar('pk')}
+        stale = [sdoc_id for doc_id, sdoc_id in sdocs.items() if doc_id not in existing]
+        searcher.clear_collection(sdoc_ids=stale)
+        removed += len(stale)
+    return removed
+
+
+def reindex_collection(document_cls, batch_size=1000, processes=None,
+                       resume_after=None, remove_stale=True, progress=None, setup=None):
+    """
+    Regenerate the solr documents of all the collection's documents
+
+    The collection is streamed in ``pk`` order with only the fields needed
+    by the searcher's converters, solr documents are generated by a pool
+    of processes and sent to solr by batch.
+
+    :param document_cls: :class:`SearchableDocument` to reindex
+    :param batch_size: number of documents per solr request
+    :param processes: number of worker processes (default to the number of
+    cpus), if 0 the solr documents are generated in the current process
+    :param resume_after: pk of the last document indexed by an interrupted
+    run, to restart from
+    :param remove_stale: remove from solr the documents no longer in mongo
+    :param progress: callback called after each batch with the
+    ``ReindexReport`` so far (its ``last_id`` can be stored to resume)
+    :param setup: function called in each worker process at startup
+    (e.g. to connect mongoengine in case of reference fields)
+    :return: a ``ReindexReport``
+
+    .. note : Must be called within a flask app context providing ``solr``
+    """
+    searcher = document_cls._search_bootstrap()
+    projection = searcher.get_projection()
+    if projection is None:
+        only_fields = None
+    else:
+        only_fields = [f for f in projection if f in document_cls._fields]
+    id_field = document_cls._fields[document_cls._meta['id_field']]
+    queryset = document_cls.objects.order_by('pk').no_cache().timeout(False)
+    if resume_after is not None:
+        queryset = queryset.filter(pk__gt=id_field.to_python(resume_after))
+    if only_fields:
+        queryset = queryset.only(*only_fields)
+    queryset = queryset.batch_size(batch_size).as_pymongo()
+
+    start = time.time()
+    indexed = 0
+    report = ReindexReport(0, 0, resume_after, 0, 0)
+    batches = _iter_batches(queryset, batch_size)
+    if processes == 0:
+        _init_worker(document_cls, only_fields, None)
+        pool = None
+        results = ((batch[-1]['_id'], _generate_solr_docs(batch)) for batch in batches)
+    else:
+        processes = processes or multiprocessing.cpu_count()
+        pool = multiprocessing.Pool(processes, initializer=_init_worker,
+                                    initargs=(document_cls, only_fields, setup))
+        results = _pool_generate_solr_docs(pool, batches, max_pending=processes * 2)
+    try:
+        for last_id, sdocs in results:
+            current_app.solr.add(sdocs, commit=False, waitFlush=False)
+            indexed += len(sdocs)
+            elapsed = time.time() - start
+            report = ReindexReport(indexed, 0, last_id, elapsed,
+                                   indexed / elapsed if elapsed else 0)
+            if progress:
+                progress(report)
+    finally:
+        if pool:
+            pool.terminate()
+
+    removed = 0
+    if remove_stale:
+        removed = _remove_stale(document_cls, searcher, batch_size)
+    current_app.solr.commit()
+    elapsed = time.time() - start
+    return report._replace(removed=removed, elapsed=elapsed,
+                           throughput=indexed / elapsed if elapsed else 0)
+
+
+def main(argv=None):
+    import argparse
+    import importlib
+    import mongoengine
+    from flask import Flask
+    from pysolr import Solr
+
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('document', help='document to reindex (module.path:DocumentClass)')
+    parser.add_argument('--mongo', required=True, help='mongodb url')
+    parser.add_argument('--solr', required=True, help='solr core url')
+    parser.add_argument('--batch-size', type=int, default=1000)
+    parser.add_argument('--processes', type=int, default=None)
+    parser.add_argument('--resume-after', default=None,
+                        help='pk of the last document indexed by an interrupted run')
+    parser.add_argument('--keep-stale', action='store_true',
+                        help="don't remove from solr the documents no longer in mongo")
+    args = parser.parse_args(argv)
+
+    module, cls_name = args.document.split(':')
+    document_cls = getattr(importlib.import_module(module), cls_name)
+
+    def setup():
+        # Connection inherited from the parent process is not fork-safe
+        mongoengine.connection.disconnect()
+        mongoengine.connect(host=args.mongo)
+
+    def progress(report):
+        print('[REINDEX] %s documents indexed (%.0f docs/s), last id: %s' %
+              (report.indexed, report.throughput, report.last_id))
+
+    setup()
+    app = Flask(__name__)
+    app.solr = Solr(args.solr)
+    with app.app_context():
+        report = reindex_collection(document_cls, batch_size=args.batch_size,
+                                    processes=args.processes, resume_after=args.resume_after,
+                                    remove_stale=not args.keep_stale, progress=progress,
+                                    setup=setup)
+    print('[REINDEX] done: %s documents indexed, %s stale removed in %.1fs (%.0f docs/s)' %
+          (report.indexed, report.removed, report.elapsed, report.throughput))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,95 @@
+import time
+import threading
+from collections import OrderedDict
+
+
+class LRUCacheBackend:
+
+    """
+    In-process cache backend keeping at most ``max_entries`` entries,
+    least recently used ones are dropped first
+
+    A backend only has to provide ``get(key)`` (returning None if missing)
+    and ``set(key, value)``, thus shared caches (memcached, redis...) can
+    be plugged instead of this one
+    """
+
+    def __init__(self, max_entries=1024):
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key):
+        with self._lock:
+            value = self._entries.pop(key, None)
+            if value is not None:
+                self._entries[key] = value
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._entries.pop(key, None)
+            self._entries[key] = value
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+
+class SolrResultCache:
+
+    """
+    Cache of solr search results (i.e. ``doc_id`` list and hits count)
+
+    Each document base type has a generation number, part of the cache
+    keys, bumped on invalidation: outdated entries are never hit again and
+    are eventually evicted by the backend.
+
+    .. note : Solr changes are not visible before solr's commit, hence the
+        ``ttl`` bounding the staleness of the entries
+    """
+
+    def __init__(self, backend=None, ttl=60):
+        """
+        :param backend: cache backend, default to a :class:`LRUCacheBackend`
+        :param ttl: lifetime (in seconds) of the cache entries
+        """
+        self.backend = backend if backend is not None else LRUCacheBackend()
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    def _generation(self, base_type):
+        return self.backend.get(('generation', base_type)) or 0
+
+    def _key(self, base_type, query):
+        return ('result', base_type, self._generation(base_type), query)
+
+    def get(self, base_type, query):
+        """
+        Retrieve the ``(doc_ids, hits)`` cached for the query or None
+
+        :param base_type: document base type the query is limited to
+        :param query: hashable normalized query (with paging)
+        """
+        entry = self.backend.get(self._key(base_type, query))
+        if entry is None or entry[0] < time.time():
+            self.misses += 1
+            return None
+        self.hits += 1
+        return entry[1], entry[2]
+
+    def set(self, base_type, query, doc_ids, hits):
+        self.backend.set(self._key(base_type, query),
+                         (time.time() + self.ttl, tuple(doc_ids), hits))
+
+    def invalidate(self, base_type):
+        """Drop all the cached results of the given document base type"""
+        self.invalidations += 1
+        self.backend.set(('generation', base_type), self._generation(base_type) + 1)
+
+    def stats(self):
+        return {'hits': self.hits, 'misses': self.misses,
+                'invalidations': self.invalidations}
@@ -1,10 +1,15 @@
 import re
+import atexit
+import threading
+from functools import lru_cache
+from collections import OrderedDict
 import mongoengine
 from pysolr import SolrError
 from flask import current_app
 
 from xin.bb.tools import list_to_pagination
 from xin.bb.model_util.version import VersionedDocument
+from xin.bb.model_util.reindex import reindex_collection
 
 
 class AsbFieldSolrConverter:
@@ -18,7 +23,8 @@ class AsbFieldSolrConverter:
     FIELD_SOLR_EXTENSION = None
 
     def __init__(self, field_name, solr_field_name=None, extractor=None,
-                 serializer=None, replace_aliases=None, aliases=None, multi=False):
+                 serializer=None, replace_aliases=None, aliases=None, multi=False,
+                 depends=None):
         """
         :param field_name: name of the field
         :param solr_field_name: name of the field in solr
@@ -31,6 +37,8 @@ class AsbFieldSolrConverter:
         :param aliases: list of possible aliases of this field in a query
         :param multi: the extractor will returns a list of value, thus
         the solr field should be considered as multiple
+        :param depends: list of the document's fields read by the extractor,
+        default to the field itself if no extractor is provided (unknown otherwise)
 
         .. note : If multi=True the solr fields names will be corrected with a
             trailing "s" (e.g. "_s" ==> "_ss" for multi)
@@ -49,6 +57,12 @@ class AsbFieldSolrConverter:
         self._replace_aliases = replace_aliases
         self._aliases = aliases or ()
         self._multi = multi
+        if depends is not None:
+            self._depends = tuple(depends)
+        elif not extractor:
+            self._depends = (field_name, )
+        else:
+            self._depends = None
 
     def replace_aliases(self, query):
         """
@@ -62,6 +76,15 @@ class AsbFieldSolrConverter:
         else:
             return re.sub(r"\b%s\b" % self._field_name, self._solr_field_name, query)
 
+    def get_aliases(self):
+        """
+        Return the names replaced by the solr field name in a query, the
+        custom ``replace_aliases`` function (if any) must be applied as well
+        """
+        if self._replace_aliases:
+            return tuple(self._aliases)
+        return tuple(self._aliases) + (self._field_name, )
+
     def _serialize(self, value):
         # Default serializer
         return {self._solr_field_name: value}
@@ -94,6 +117,70 @@ class AsbFieldSolrConverter:
                 reduced[key].append(value)
         return reduced
 
+    def compile_solr_builder(self):
+        """
+        Return a function ``fill(doc, sdoc)`` writing the solr fields of the
+        given document into the ``sdoc`` dict, equivalent to (but cheaper than)
+        ``sdoc.update(self.build_solr(doc))``
+        """
+        cls = type(self)
+        if (cls.build_solr is not AsbFieldSolrConverter.build_solr or
+                cls._multi_serialize_and_reduce is not
+                AsbFieldSolrConverter._multi_serialize_and_reduce):
+            # Custom generation, cannot do better than the generic way
+            def fill(doc, sdoc):
+                sdoc.update(self.build_solr(doc))
+            return fill
+
+        extractor = self._extractor
+        if not extractor:
+            field_name = self._field_name
+
+            def extractor(doc):
+                return getattr(doc, field_name, None)
+        solr_field_name = self._solr_field_name
+        serialize = None
+        if cls._serialize is not AsbFieldSolrConverter._serialize:
+            serialize = self._serialize
+
+        if not self._multi:
+            if serialize:
+                def fill(doc, sdoc):
+                    value = extractor(doc)
+                    if value:
+                        sdoc.update(serialize(value))
+            else:
+                def fill(doc, sdoc):
+                    value = extractor(doc)
+                    if value:
+                        sdoc[solr_field_name] = value
+        elif serialize:
+            def fill(doc, sdoc):
+                values = extractor(doc)
+                if not values:
+                    return
+                if not isinstance(values, (list, tuple)):
+                    values = (values, )
+                reduced = {}
+                for v in values:
+                    if v:
+                        for key, value in serialize(v).items():
+                            if key not in reduced:
+                                reduced[key] = []
+                            reduced[key].append(value)
+                sdoc.update(reduced)
+        else:
+            def fill(doc, sdoc):
+                values = extractor(doc)
+                if not values:
+                    return
+                if not isinstance(values, (list, tuple)):
+                    values = (values, )
+                values = [v for v in values if v]
+                if values:
+                    sdoc[solr_field_name] = values
+        return fill
+
     @classmethod
     def can_convert(self, field_cls):
         """
@@ -143,6 +230,29 @@ class ReferenceFieldSolrConverter(AsbFieldSolrConverter):
         return {self._solr_field_name: str(value.id)}
 
 
+def _build_path_extractor(path, multi):
+    # Follow the path through embedded documents, flattening the lists
+    def extractor(doc):
+        values = [doc]
+        for name in path:
+            next_values = []
+            for value in values:
+                _flatten(getattr(value, name, None), next_values)
+            values = next_values
+        if multi:
+            return values
+        return values[0] if values else None
+    return extractor
+
+
+def _flatten(value, flattened):
+    if isinstance(value, (list, tuple)):
+        for v in value:
+            _flatten(v, flattened)
+    elif value is not None:
+        flattened.append(value)
+
+
 class SolrFieldConverterManager:
 
     """
@@ -161,6 +271,8 @@ class SolrFieldConverterManager:
             GenericReferenceFieldSolrConverter,
             ReferenceFieldSolrConverter
         ]
+        # Mongoengine field class -> converter class
+        self._resolved = {}
 
     def register_converter_cls(self, converter_cls):
         """
@@ -168,26 +280,65 @@ class SolrFieldConverterManager:
         """
         # Register backward to prevent base generic fields to shadow
         self._converters.insert(0, converter_cls)
+        self._resolved.clear()
+
+    def resolve_converter_cls(self, field_cls):
+        """
+        Retrieve the converter class able to handle the given mongoengine
+        field class (or None)
+
+        .. note : If multiple converter can match the field, the one
+            added last will be used
+        """
+        try:
+            return self._resolved[field_cls]
+        except KeyError:
+            pass
+        converter_cls = next((c for c in self._converters
+                              if c.can_convert(field_cls)), None)
+        self._resolved[field_cls] = converter_cls
+        return converter_cls
 
     def build_converter(self, field_name, field, **kwargs):
         """
         Retrieve and build a converter for the given field
 
-        :param field_name: name of the field
+        :param field_name: name of the field, can be a dotted path (e.g.
+        ``address.city``) to reach a field of an embedded document
         :param field: field on which the converter will be used
         :param kwargs: additional params passed to converter ``__init__``
 
         .. note : If multiple converter can match the field, the one
             added last will be used
+
+        .. note : Nested ``ListField`` are flattened into a single
+            multiple solr field
         """
-        if isinstance(field, mongoengine.fields.ListField):
-            kwargs.setdefault('multi', True)
-            field_cls = type(field.field)
-        else:
-            kwargs.setdefault('multi', False)
-            field_cls = type(field)
-        converter = next((c for c in self._converters
-                          if c.can_convert(field_cls)), None)
+        path = field_name.split('.')
+        sub_path = path[1:]
+        lists_depth = 0
+        # Unwrap list and embedded document fields to find the actual field
+        while True:
+            if isinstance(field, mongoengine.fields.ListField):
+                lists_depth += 1
+                field = field.field
+            elif isinstance(field, mongoengine.fields.EmbeddedDocumentField) and sub_path:
+                field = field.document_type._fields[sub_path.pop(0)]
+            else:
+                break
+        if sub_path:
+            raise NotImplementedError('Cannot reach %s in field %s' % ('.'.join(sub_path), path[0]))
+        field_cls = field if isinstance(field, type) else type(field)
+        converter = self.resolve_converter_cls(field_cls)
+        if not converter:
+            raise NotImplementedError('No solr converter for field %s (%s)' %
+                                      (field_name, field_cls.__name__))
+        kwargs.setdefault('multi', lists_depth > 0)
+        if len(path) > 1 or lists_depth > 1:
+            kwargs.setdefault('extractor', _build_path_extractor(path, kwargs['multi']))
+            kwargs.setdefault('depends', (path[0], ))
+        if len(path) > 1:
+            kwargs.setdefault('solr_field_name', '_'.join(path) + converter.FIELD_SOLR_EXTENSION)
         return converter(field_name, **kwargs)
 
 
@@ -197,6 +348,136 @@ solr_register_field_converter = solr_field_converter_manager.register_converter_
 solr_build_converter = solr_field_converter_manager.build_converter
 
 
+def _solr_quote(value):
+    return '"%s"' % str(value).replace('\\', '\\\\').replace('"', '\\"')
+
+
+def solr_delete_ids(solr, sdoc_ids, chunk_size=500, **kwargs):
+    """
+    Remove several solr documents by id
+
+    pysolr's ``delete(id=...)`` only handles a single id, hence the delete
+    by query (chunked to stay under solr's max boolean clauses)
+    """
+    sdoc_ids = list(sdoc_ids)
+    for i in range(0, len(sdoc_ids), chunk_size):
+        chunk = sdoc_ids[i:i + chunk_size]
+        solr.delete(q='id:(%s)' % ' OR '.join(_solr_quote(sdoc_id) for sdoc_id in chunk),
+                    **kwargs)
+
+
+class SolrIndexBuffer:
+
+    """
+    Collect solr additions and deletions to send them by batch
+
+    Multiple operations on the same solr document are merged (only the
+    last one is kept). The buffer is flushed once ``max_size`` operations
+    are pending, ``max_delay`` seconds after the oldest pending operation
+    (by a timer thread), at exit, or by calling :meth:`flush` explicitly
+    (typically on request teardown and in tests)::
+
+        app.teardown_appcontext(lambda exc: solr_index_buffer.flush())
+
+    The solr connection is resolved when an operation is queued, so the
+    buffer can be flushed outside of the app context (e.g. at the end of a
+    script). If sending them fails, the operations are kept and sent again
+    by the next flush.
+    """
+
+    def __init__(self, solr=None, max_size=500, max_delay=5.0):
+        """
+        :param solr: solr connection to use, default to ``current_app.solr``
+        :param max_size: number of pending operations triggering a flush
+        :param max_delay: age (in seconds) of the oldest pending operation
+        triggering a flush
+        """
+        self._solr = solr
+        self.max_size = max_size
+        self.max_delay = max_delay
+        self._lock = threading.RLock()
+        # solr connection -> (additions by id, deleted ids)
+        self._pending = OrderedDict()
+        self._timer = None
+        atexit.register(self.flush)
+
+    def __len__(self):
+        return sum(len(adds) + len(deletes) for adds, deletes in self._pending.values())
+
+    def _get_pending(self):
+        solr = self._solr or current_app.solr
+        pending = self._pending.get(solr)
+        if pending is None:
+            pending = self._pending[solr] = (OrderedDict(), set())
+        return pending
+
+    def add(self, sdoc):
+        """Schedule the addition (or replacement) of a solr document"""
+        with self._lock:
+            adds, deletes = self._get_pending()
+            deletes.discard(sdoc['id'])
+            adds.pop(sdoc['id'], None)
+            adds[sdoc['id']] = sdoc
+            self._on_new_operation()
+
+    def delete(self, sdoc_id):
+        """Schedule the deletion of a solr document"""
+        with self._lock:
+            adds, deletes = self._get_pending()
+            adds.pop(sdoc_id, None)
+            deletes.add(sdoc_id)
+            self._on_new_operation()
+
+    def _on_new_operation(self):
+        if len(self) >= self.max_size:
+            self.flush()
+        elif self._timer is None:
+            self._start_timer()
+
+    def _start_timer(self):
+        self._timer = threading.Timer(self.max_delay, self._flush_on_timer)
+        self._timer.daemon = True
+        self._timer.start()
+
+    def _flush_on_timer(self):
+        with self._lock:
+            self._timer = None
+            try:
+                self.flush()
+            except Exception as exc:
+                # Operations are kept, flush restarted the timer to retry
+                print('[SOLR INDEX BUFFER] Flush failed: %r' % exc)
+
+    def flush(self, **kwargs):
+        """
+        Send all the pending operations to solr
+
+        :param kwargs: additional params passed to solr ``add``/``delete``
+        """
+        with self._lock:
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+            kwargs.setdefault('commit', False)
+            kwargs.setdefault('waitFlush', False)
+            while self._pending:
+                # Lock is held while sending, no operation comes meanwhile
+                solr, (adds, deletes) = next(iter(self._pending.items()))
+                try:
+                    if deletes:
+                        solr_delete_ids(solr, deletes, **kwargs)
+                    if adds:
+                        solr.add(list(adds.values()), **kwargs)
+                except Exception:
+                    self._start_timer()
+                    raise
+                del self._pending[solr]
+
+
+# Created a single default instance to share among searchers
+solr_index_buffer = SolrIndexBuffer()
+
+
 class Searcher:
 
     """
@@ -213,6 +494,11 @@ class Searcher:
         """Register into solr the current mongoengine document"""
         raise NotImplementedError()
 
+    def build_documents(self, documents):
+        """Register into solr several mongoengine documents"""
+        for document in documents:
+            self.build_document(document)
+
     def clear_document(self, document):
         """Remove from solr the current mongoengine document"""
         document = document or self.document
@@ -231,38 +517,60 @@ def get_document_base_type(document):
     return document._class_name.split('.')[0]
 
 
+def get_solr_doc_id(document):
+    return '%s-%s' % (document._class_name, document.pk)
+
+
 class BaseSolrSearcher(Searcher):
 
     """
     Base searcher class for solr integration
+
+    Set ``INDEX_BUFFER`` (e.g. to ``solr_index_buffer``) to send the
+    documents to solr by batch instead of one request per save/delete
+
+    Set ``RESULT_CACHE`` (e.g. to a :class:`SolrResultCache`) to cache
+    the searches' results until the collection is modified
     """
 
     FIELDS = ()
+    INDEX_BUFFER = None
+    RESULT_CACHE = None
+    ALIASES_CACHE_SIZE = 1024
 
     def __init__(self, *args, converters=None, **kwargs):
         super().__init__(*args, **kwargs)
         dcls = self.document_cls
+        self._converters_count = None
+        self._aliases_replacer = None
+        self._solr_doc_builder = None
+        self._cached_replace_aliases = lru_cache(
+            maxsize=self.ALIASES_CACHE_SIZE)(self._do_replace_aliases)
         # Add default fields
         self.converters = [
             StringFieldSolrConverter('id', extractor=lambda doc: str(doc.id),
-                                     solr_field_name='doc_id'),
+                                     solr_field_name='doc_id', depends=('id', )),
             StringFieldSolrConverter('_class_name', solr_field_name='doc_type',
                                      replace_aliases=lambda x: x),
             StringFieldSolrConverter('_class_name', solr_field_name='doc_base_type',
-                                     extractor=get_document_base_type, replace_aliases=lambda x: x),
+                                     extractor=get_document_base_type, replace_aliases=lambda x: x,
+                                     depends=()),
             IntFieldSolrConverter('doc_version', aliases=('_version',)),
             DateTimeFieldSolrConverter('doc_updated', aliases=('_updated',)),
             DateTimeFieldSolrConverter('doc_created', aliases=('_created',)),
         ]
         for field in self.FIELDS:
-            field_cls = getattr(dcls, field, None)
+            # Nested fields (e.g. ``address.city``) are converted from their root field
+            field_cls = getattr(dcls, field.split('.')[0], None)
             if field_cls:
                 self.converters.append(solr_build_converter(field, field_cls))
 
     def build_and_register_converter(self, *args, **kwargs):
         self.converters.append(solr_build_converter(*args, **kwargs))
+        self._invalidate_converters()
 
-    def register_custom_field(self, field_name, field_cls, field_extractor, alias=None):
+    def register_custom_field(self, field_name, field_cls, field_extractor, alias=None,
+                              depends=None):
         """
         Register a special field for the solr document
 
@@ -271,16 +579,71 @@ class BaseSolrSearcher(Searcher):
         :param field_extractor: function that return the field's value
         from a given document or None
         :param alias: list of additional alias for the field
+        :param depends: list of the document's fields read by ``field_extractor``
         """
         self.converters.append(
-            solr_build_converter(field_name, field_cls, extractor=field_extractor, aliases=alias))
+            solr_build_converter(field_name, field_cls, extractor=field_extractor, aliases=alias,
+                                 depends=depends))
+        self._invalidate_converters()
 
-    def _replace_aliases(self, query):
+    def get_projection(self):
+        """
+        Return the document's fields needed to generate the solr document,
+        or None if some converters rely on unknown fields
+        """
+        fields = set()
+        for c in self.converters:
+            if c._depends is None:
+                return None
+            fields.update(c._depends)
+        return fields
+
+    def _invalidate_converters(self):
+        self._converters_count = len(self.converters)
+        self._aliases_replacer = None
+        self._solr_doc_builder = None
+        self._cached_replace_aliases.cache_clear()
+
+    def _check_converters(self):
+        # Converters list can also be modified directly by subclasses
+        if self._converters_count != len(self.converters):
+            self._invalidate_converters()
+
+    def _build_aliases_replacer(self):
+        # Merge all the converters' aliases into a single pattern, the first
+        # converter declaring an alias wins as it would have replaced it first
+        aliases = {}
+        custom_replacers = []
         for c in self.converters:
-            query = c.replace_aliases(query)
+            for alias in c.get_aliases():
+                aliases.setdefault(alias, c._solr_field_name)
+            if c._replace_aliases:
+                custom_replacers.append(c._replace_aliases)
+        if aliases:
+            # Longest first to have the alternation prefer the longest match
+            pattern = re.compile(r"\b(%s)\b" % '|'.join(
+                re.escape(a) for a in sorted(aliases, key=len, reverse=True)))
+        else:
+            pattern = None
+        return pattern, aliases, custom_replacers
+
+    def _do_replace_aliases(self, query):
+        pattern, aliases, custom_replacers = self._aliases_replacer
+        if pattern:
+            query = pattern.sub(lambda m: aliases[m.group(1)], query)
+        for replacer in custom_replacers:
+            query = replacer(query)
         return query
 
-    def search_or_abort(self, q=None, fq=None, sort=None, page=1, per_page=20):
+    def _replace_aliases(self, query):
+        self._check_converters()
+        if not self._aliases_replacer:
+            self._aliases_replacer = self._build_aliases_replacer()
+        return self._cached_replace_aliases(query)
+
+    def search_or_abort(self, q=None, fq=None, sort=None, page=1, per_page=20,
+                        only=None, from_solr=False, cursor=None, facets=None,
+                        range_facets=None):
         """
 
         :param q: solr style query
@@ -288,81 +651,315 @@ class BaseSolrSearcher(Searcher):
         :param sort: solr style list of query sorters
         :param page: current page to retrieve
         :param per_page: number of elements per page
-        :return: a ``Pagination`` of mongoengine documents
+        :param only: list of the document's fields to retrieve
+        :param from_solr: build the items from the fields stored in solr
+        instead of retrieving the documents from mongo
+        :param cursor: continuation token (``'*'`` for the first page) to
+        paginate with solr's cursorMark instead of ``page``, the next token
+        is provided in the pagination's ``next_cursor`` (None on the last page)
+        :param facets: list of fields (or aliases) to count the values of
+        :param range_facets: dict of field (or alias) to ``(start, end, gap)``
+        in solr syntax (e.g. ``('NOW/DAY-7DAYS', 'NOW', '+1DAY')``) to count
+        the values by range of
+        :return: a ``Pagination`` of mongoengine documents (or dicts of
+        fields if ``from_solr`` is set), facet counts are provided in the
+        pagination's ``facets``
+
+        .. note : Deep pages (i.e. high ``page``) are expensive for solr,
+            ``cursor`` pagination keeps a constant cost per page
+
+        .. note : With ``per_page=0`` only the counts are retrieved, mongo
+            is not queried at all
+        """
+        q, kwargs = self._build_query(q, fq, sort)
+        kwargs['rows'] = per_page
+        if cursor is None:
+            kwargs['start'] = (page - 1) * per_page
+        else:
+            kwargs['cursorMark'] = cursor
+            kwargs['sort'] = self._cursor_sort(kwargs.get('sort'))
+        facet_names = {}
+        if facets or range_facets:
+            facet_names = self._build_facet_params(kwargs, facets, range_facets)
+        if from_solr:
+            items, hits, next_cursor, facet_counts = self._solr_search_fields(
+                q, only=only, **kwargs)
+        else:
+            doc_ids, hits, next_cursor, facet_counts = self._cached_solr_search(q, **kwargs)
+            # Pagination is already handled by solr, thus we use a dummy
+            # one in mongo and correct it according to solr's query
+            items = self.fetch_documents(doc_ids, only=only)
+        if next_cursor == cursor:
+            # Solr returns the same cursor once all the results are read
+            next_cursor = None
+        items = list_to_pagination(None, items, already_sliced=True, page=page,
+                                   per_page=per_page, total=hits, next_cursor=next_cursor,
+                                   facets=self._parse_facets(facet_counts, facet_names),
+                                   q=q, fq=fq, sort=sort)
+        return items
+
+    def iter_search(self, q=None, fq=None, sort=None, per_page=100, only=None):
+        """
+        Generator of all the mongoengine documents matching the query
+
+        Solr's cursorMark is used to retrieve the pages (hence a stable
+        order and a constant cost per page), useful for exports
+
+        :param q: solr style query
+        :param fq: solr style list of query filters
+        :param sort: solr style list of query sorters
+        :param per_page: number of documents retrieved per request
+        :param only: list of the document's fields to retrieve
         """
+        q, kwargs = self._build_query(q, fq, sort)
+        for results in self.iter_solr_search(q, rows=per_page, fl='doc_id', **kwargs):
+            yield from self.fetch_documents([d['doc_id'] for d in results], only=only)
+
+    def iter_solr_search(self, q, fq=None, sort=None, **kwargs):
+        """
+        Generator of the solr result pages of a query limited to the current
+        collection, paginated with solr's cursorMark
+
+        .. note : Sort is completed with the solr unique key as required
+            by the cursorMark
+        """
+        sort = self._cursor_sort(sort)
+        cursor = '*'
+        while True:
+            results = self.solr_search(q, fq=list(fq or ()), sort=sort,
+                                       cursorMark=cursor, **kwargs)
+            yield results
+            next_cursor = getattr(results, 'nextCursorMark', None)
+            if not next_cursor or next_cursor == cursor:
+                return
+            cursor = next_cursor
+
+    def _build_query(self, q, fq, sort):
+        # Return the query with aliases replaced and the solr params
         if not q:
             q = '*:*'
         else:
             q = self._replace_aliases(q)
-        kwargs = {'start': (page - 1) * per_page, 'rows': per_page, 'q': q}
+        kwargs = {}
         if fq:
             kwargs['fq'] = [self._replace_aliases(e) for e in fq]
         if sort:
             kwargs['sort'] = [self._replace_aliases(e) for e in sort]
+        return q, kwargs
+
+    @staticmethod
+    def _cursor_sort(sort):
+        # CursorMark needs the unique key as sort tie-breaker
+        if not sort:
+            return ['id asc']
+        if isinstance(sort, str):
+            sort = sort.split(',')
+        sort = list(sort)
+        if not any(s.split()[0] == 'id' for s in sort):
+            sort.append('id asc')
+        return sort
+
+    def _build_facet_params(self, params, facets=None, range_facets=None):
+        # Add the facets to the solr params, return the solr field to
+        # facet name mapping
+        names = {}
+        params['facet'] = 'true'
+        params['facet.mincount'] = 1
+        if facets:
+            params['facet.field'] = []
+            for name in facets:
+                field = self._replace_aliases(name)
+                names[field] = name
+                params['facet.field'].append(field)
+        if range_facets:
+            params['facet.range'] = []
+            for name, (start, end, gap) in range_facets.items():
+                field = self._replace_aliases(name)
+                names[field] = name
+                params['facet.range'].append(field)
+                params['f.%s.facet.range.start' % field] = start
+                params['f.%s.facet.range.end' % field] = end
+                params['f.%s.facet.range.gap' % field] = gap
+        return names
+
+    @staticmethod
+    def _parse_facets(facet_counts, names):
+        # Convert solr's flat [value, count, value, count...] lists into
+        # ordered dicts of value to count
+        if not names:
+            return None
+        facets = {}
+        for field, counts in facet_counts.get('facet_fields', {}).items():
+            facets[names.get(field, field)] = OrderedDict(zip(counts[::2], counts[1::2]))
+        for field, ranges in facet_counts.get('facet_ranges', {}).items():
+            counts = ranges.get('counts', ())
+            facets[names.get(field, field)] = OrderedDict(zip(counts[::2], counts[1::2]))
+        return facets
+
+    def _cached_solr_search(self, q, fq=None, sort=None, start=0, rows=20, cursorMark=None,
+                            **params):
+        # Return the doc_id list, the hits count of the query, the next
+        # cursor and the facet counts
+        cache = self.RESULT_CACHE if cursorMark is None and not params else None
+        if cache is not None:
+            base_type = get_document_base_type(self.document_cls)
+            key = (q, tuple(fq or ()), tuple(sort or ()), start, rows)
+            cached = cache.get(base_type, key)
+            if cached:
+                return cached + (None, {})
+        params['rows'] = rows
+        if cursorMark is None:
+            params['start'] = start
+        else:
+            params['cursorMark'] = cursorMark
         try:
-            docs = self.solr_search(**kwargs)
-            hits = docs.hits
+            docs = self.solr_search(q, fq=fq, sort=sort, **params)
         except SolrError as e:
             current_app.logger.warning('SolrError: %s' % str(e))
-            docs = ()
-            hits = 0
-        # Pagination is already handled by solr, thus we use a dummy
-        # one in mongo and correct it according to solr's query
-        items = self.document_cls.objects(pk__in=[d['doc_id'] for d in docs])
-        if 'sort' in kwargs:
-            # If needed, reorder the results from mongo to match the original
-            # order provided by solr
-            ordered_items = []
-            for d in docs:
-                doc_id = d['doc_id']
-                for item in items:
-                    pk = str(item.pk)
-                    if pk == doc_id:
-                        ordered_items.append(item)
-            items = ordered_items
-        items = list_to_pagination(items, already_sliced=True, page=page,
-                                   per_page=per_page, total=hits,
-                                   q=q, fq=fq, sort=sort)
+            return (), 0, None, {}
+        doc_ids = [d['doc_id'] for d in docs]
+        if cache is not None:
+            cache.set(base_type, key, doc_ids, docs.hits)
+        return (doc_ids, docs.hits, getattr(docs, 'nextCursorMark', None),
+                getattr(docs, 'facets', {}))
+
+    def _solr_search_fields(self, q, only=None, **kwargs):
+        # Return the documents' fields stored in solr, the hits count,
+        # the next cursor and the facet counts
+        solr_to_field = {}
+        for c in self.converters:
+            # doc_base_type is derived from _class_name, only doc_type holds its value
+            if c._solr_field_name != 'doc_base_type':
+                solr_to_field.setdefault(c._solr_field_name, c._field_name)
+        if only:
+            only = set(only)
+            kwargs['fl'] = ','.join(solr_field for solr_field, field in solr_to_field.items()
+                                    if field in only or solr_field == 'doc_id')
+        try:
+            docs = self.solr_search(q, **kwargs)
+        except SolrError as e:
+            current_app.logger.warning('SolrError: %s' % str(e))
+            return [], 0, None, {}
+        items = []
+        for sdoc in docs:
+            items.append({solr_to_field[key]: value for key, value in sdoc.items()
+                          if key in solr_to_field})
+        return (items, docs.hits, getattr(docs, 'nextCursorMark', None),
+                getattr(docs, 'facets', {}))
+
+    def _invalidate_results(self):
+        if self.RESULT_CACHE is not None:
+            self.RESULT_CACHE.invalidate(get_document_base_type(self.document_cls))
+
+    def fetch_documents(self, doc_ids, only=None):
+        """
+        Retrieve from mongo the documents matching the given solr ``doc_id``
+        list, preserving the order provided by solr
+
+        :param doc_ids: list of ``doc_id`` returned by solr
+        :param only: list of the document's fields to retrieve (default to all)
+
+        .. note : Solr hits without matching mongo document (i.e. stale
+            index entries) are skipped and reported in the logs
+        """
+        if not doc_ids:
+            return []
+        queryset = self.document_cls.objects(pk__in=doc_ids)
+        if only:
+            queryset = queryset.only(*only)
+        by_id = {str(item.pk): item for item in queryset}
+        items = []
+        stale = []
+        for doc_id in doc_ids:
+            item = by_id.get(doc_id)
+            if item is None:
+                stale.append(doc_id)
+            else:
+                items.append(item)
+        if stale:
+            current_app.logger.warning(
+                'Solr index out of sync for %s, missing documents: %s' %
+                (self.document_cls.__name__, ', '.join(stale)))
         return items
 
     def generate_solr_doc(self, document):
         """
         Create a solr document from a mongoengine document
         """
+        self._check_converters()
+        if not self._solr_doc_builder:
+            self._solr_doc_builder = tuple(c.compile_solr_builder() for c in self.converters)
         sdoc = {
-            'id': '%s-%s' % (document._class_name, document.pk),
+            'id': get_solr_doc_id(document),
         }
-        for c in self.converters:
-            sdoc.update(c.build_solr(document))
+        for fill in self._solr_doc_builder:
+            fill(document, sdoc)
         return sdoc
 
     def build_document(self, document, **kwargs):
         """
         Register into solr the current mongoengine document
+
+        .. note : If the searcher has an ``INDEX_BUFFER`` and no
+            additional params are provided, the document is only
+            scheduled for indexing
         """
-        kwargs.setdefault('commit', False)
-        kwargs.setdefault('waitFlush', False)
         doc = self.generate_solr_doc(document)
+        self._invalidate_results()
         # Given we use document's pk as solr id, no need to clear the
         # previous solr document (will be replace by the new one)
+        if self.INDEX_BUFFER is not None and not kwargs:
+            self.INDEX_BUFFER.add(doc)
+            return
+        kwargs.setdefault('commit', False)
+        kwargs.setdefault('waitFlush', False)
         current_app.solr.add((doc,), **kwargs)
 
+    def build_documents(self, documents, **kwargs):
+        """
+        Register into solr several mongoengine documents in a single request
+        """
+        sdocs = [self.generate_solr_doc(document) for document in documents]
+        self._invalidate_results()
+        if self.INDEX_BUFFER is not None and not kwargs:
+            for sdoc in sdocs:
+                self.INDEX_BUFFER.add(sdoc)
+            return
+        kwargs.setdefault('commit', False)
+        kwargs.setdefault('waitFlush', False)
+        current_app.solr.add(sdocs, **kwargs)
+
     def clear_document(self, document, **kwargs):
         """
         Remove from solr the current mongoengine document
         """
+        if not document.pk:
+            return
+        sdoc_id = get_solr_doc_id(document)
+        self._invalidate_results()
+        if self.INDEX_BUFFER is not None and not kwargs:
+            self.INDEX_BUFFER.delete(sdoc_id)
+            return
         kwargs.setdefault('commit', False)
         kwargs.setdefault('waitFlush', False)
-        if document.pk:
-            sdoc_id = '%s-%s' % (document._class_name, document.pk)
-            current_app.solr.delete(id=sdoc_id, **kwargs)
+        current_app.solr.delete(id=sdoc_id, **kwargs)
 
-    def clear_collection(self, **kwargs):
+    def clear_collection(self, sdoc_ids=None, **kwargs):
         """
         Remove the entire collection from solr
+
+        :param sdoc_ids: only remove the solr documents with those ids
         """
+        if self.INDEX_BUFFER is not None:
+            # Pending operations must not resurrect the cleared documents
+            self.INDEX_BUFFER.flush()
+        self._invalidate_results()
         kwargs.setdefault('commit', False)
         kwargs.setdefault('waitFlush', False)
+        if sdoc_ids is not None:
+            if sdoc_ids:
+                solr_delete_ids(current_app.solr, sdoc_ids, **kwargs)
+            return
         base_type = get_document_base_type(self.document_cls)
         current_app.solr.delete(q='doc_base_type:' + base_type, **kwargs)
 
@@ -384,28 +981,49 @@ class SearchableDocument(VersionedDocument):
 
     """
     Mongoengine abstract document providing search functionalities
+
+    Documents are indexed on save unless the ``search_sync_on_save`` meta
+    param is False (e.g. when indexed by a
+    :class:`xin.bb.model_util.solr_sync.SolrSyncWorker`)
     """
-    meta = {'abstract': True, 'searcher_cls': None, '_searcher': None}
+    meta = {'abstract': True, 'searcher_cls': None, '_searcher': None,
+            'search_sync_on_save': True}
 
-    def __init__(self, *args, **kwargs):
-        super().__init__(*args, **kwargs)
-        searcher_cls = self._meta.get('searcher_cls')
-        if searcher_cls:
-            self.searcher = self._search_bootstrap()
+    @property
+    def searcher(self):
+        return self._search_bootstrap()
+
+    @classmethod
+    def _collect_hooks(cls, hooks):
+        super()._collect_hooks(hooks)
+        if cls._meta.get('searcher_cls') and cls._meta.get('search_sync_on_save', True):
+            # Keep solr in sync
+            searcher = cls._search_bootstrap()
+            hooks['post_save'].append(searcher.on_post_save)
+            hooks['post_delete'].append(searcher.on_post_delete)
 
     @classmethod
     def _search_bootstrap(cls):
         if cls._meta['_searcher']:
             return cls._meta['_searcher']
-        # Register signals to trigger solr sync
         searcher_cls = cls._meta.get('searcher_cls')
         if not searcher_cls:
             raise NotImplementedError('No searcher setted for this document')
-        searcher = searcher_cls(cls)
-        mongoengine.signals.post_save.connect(searcher.on_post_save, sender=cls)
-        mongoengine.signals.post_delete.connect(searcher.on_post_delete, sender=cls)
-        cls._meta['_searcher'] = searcher
-        return searcher
+        cls._meta['_searcher'] = searcher_cls(cls)
+        return cls._meta['_searcher']
+
+    @classmethod
+    def _bulk_post_save(cls, documents, created):
+        super()._bulk_post_save(documents, created)
+        if cls._meta.get('searcher_cls') and cls._meta.get('search_sync_on_save', True):
+            cls._search_bootstrap().build_documents(documents)
+
+    @classmethod
+    def reindex(cls, **kwargs):
+        """
+        Shortcut to :func:`xin.bb.model_util.reindex.reindex_collection`
+        """
+        return reindex_collection(cls, **kwargs)
 
     @classmethod
     def search_or_abort(cls, *args, **kwargs):
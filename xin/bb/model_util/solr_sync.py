@@ -0,0 +1,207 @@
+"""
+Keep the solr index of searchable collections in sync by tailing the
+mongodb oplog (needs a replica set), thus also indexing the writes done
+outside of mongoengine (raw pymongo, other services...)
+
+Can be run as a command::
+
+    python -m xin.bb.model_util.solr_sync myapp.model:MyDocument myapp.model:Other \\
+        --mongo mongodb://localhost:27017/mydb --solr http://localhost:8983/solr/core
+"""
+import time
+from flask import current_app
+from pymongo import CursorType
+
+from xin.bb.model_util.searcher import get_document_base_type
+
+
+class SolrSyncError(Exception):
+    pass
+
+
+class SolrSyncWorker:
+
+    """
+    Tail the oplog of the given :class:`SearchableDocument` collections and
+    send the changes to solr by batch
+
+    Documents modified within a batch are fetched once with only the fields
+    needed by their searcher, those no longer in mongo are removed from
+    solr. Once a batch is sent, the timestamp of its last oplog entry is
+    saved as checkpoint to restart from.
+
+    The first run starts from the end of the oplog, use
+    :func:`xin.bb.model_util.reindex.reindex_collection` for the initial
+    indexing. Set the ``search_sync_on_save`` meta param of the documents
+    to False to stop indexing them in the writing process.
+
+    .. note : Must be run within a flask app context providing ``solr``
+    """
+
+    def __init__(self, document_classes, name='default', batch_size=500,
+                 max_delay=1.0, checkpoint_collection='solr_sync'):
+        """
+        :param document_classes: :class:`SearchableDocument` to keep in sync
+        (must be in the same database)
+        :param name: name of the worker's checkpoint
+        :param batch_size: number of modified documents triggering a batch
+        :param max_delay: age (in seconds) of the oldest pending change
+        triggering a batch
+        :param checkpoint_collection: collection storing the checkpoints
+        """
+        self.name = name
+        self.batch_size = batch_size
+        self.max_delay = max_delay
+        self._documents = {}
+        for document_cls in document_classes:
+            collection = document_cls._get_collection()
+            self._documents[collection.full_name] = document_cls
+        db = document_classes[0]._get_db()
+        self._oplog = db.client.local['oplog.rs']
+        self._checkpoints = db[checkpoint_collection]
+        self._pending = {}
+        self._pending_count = 0
+        self._pending_ts = None
+        self._oldest = None
+        self.indexed = 0
+        self.removed = 0
+
+    def load_checkpoint(self):
+        checkpoint = self._checkpoints.find_one({'_id': self.name})
+        return checkpoint['ts'] if checkpoint else None
+
+    def save_checkpoint(self, ts):
+        self._checkpoints.update_one({'_id': self.name}, {'$set': {'ts': ts}}, upsert=True)
+
+    def _get_start_ts(self):
+        ts = self.load_checkpoint()
+        first = self._oplog.find_one(sort=[('$natural', 1)])
+        if ts is None:
+            last = self._oplog.find_one(sort=[('$natural', -1)])
+            return last['ts'] if last else None
+        if first and first['ts'] > ts:
+            raise SolrSyncError('Checkpoint %s is no longer in the oplog, '
+                                'a full reindex is needed' % ts)
+        return ts
+
+    def run(self, stop=None):
+        """
+        Process the oplog until ``stop`` (a ``threading.Event``) is set
+
+        :param stop: event to stop the worker, run forever if not provided
+        """
+        ts = self._get_start_ts()
+        query = {'ns': {'$in': list(self._documents)}}
+        while not (stop and stop.is_set()):
+            if ts is not None:
+                query['ts'] = {'$gt': ts}
+            cursor = self._oplog.find(query, cursor_type=CursorType.TAILABLE_AWAIT,
+                                      oplog_replay=True)
+            while cursor.alive and not (stop and stop.is_set()):
+                for entry in cursor:
+                    ts = entry['ts']
+                    self._on_entry(entry)
+                    if self._oldest is not None and (
+                            self._pending_count >= self.batch_size or
+                            time.monotonic() - self._oldest >= self.max_delay):
+                        self.flush()
+                    if stop and stop.is_set():
+                        break
+                # No more entries for now
+                self.flush()
+            if not cursor.alive:
+                # Empty oplog or cursor invalidated, retry later
+                time.sleep(1)
+        self.flush()
+
+    def _on_entry(self, entry):
+        op = entry['op']
+        if op in ('i', 'd'):
+            pk = entry['o']['_id']
+        elif op == 'u':
+            pk = entry['o2']['_id']
+        else:
+            # Command or no-op
+            return
+        # The document's current state is fetched at flush time, so only
+        # the modified pks are needed
+        pks = self._pending.setdefault(entry['ns'], set())
+        if pk not in pks:
+            pks.add(pk)
+            self._pending_count += 1
+        if self._oldest is None:
+            self._oldest = time.monotonic()
+        self._pending_ts = entry['ts']
+
+    def flush(self):
+        """Send the pending changes to solr and save the checkpoint"""
+        if self._pending_ts is None:
+            return
+        for ns, pks in self._pending.items():
+            self._sync_documents(self._documents[ns], pks)
+        self.save_checkpoint(self._pending_ts)
+        self._pending.clear()
+        self._pending_count = 0
+        self._pending_ts = None
+        self._oldest = None
+
+    def _sync_documents(self, document_cls, pks):
+        searcher = document_cls._search_bootstrap()
+        queryset = document_cls.objects(pk__in=list(pks))
+        projection = searcher.get_projection()
+        if projection is not None:
+            queryset = queryset.only(*[f for f in projection if f in document_cls._fields])
+        sdocs = []
+        for document in queryset:
+            pks.discard(document.pk)
+            sdocs.append(searcher.generate_solr_doc(document))
+        if sdocs:
+            current_app.solr.add(sdocs, commit=False, waitFlush=False)
+        if pks:
+            # Deleted documents, their solr id depends on their (unknown) class
+            current_app.solr.delete(q='doc_base_type:%s AND doc_id:(%s)' % (
+                get_document_base_type(document_cls),
+                ' OR '.join('"%s"' % pk for pk in pks)), commit=False, waitFlush=False)
+        searcher._invalidate_results()
+        self.indexed += len(sdocs)
+        self.removed += len(pks)
+
+
+def main(argv=None):
+    import argparse
+    import importlib
+    import mongoengine
+    from flask import Flask
+    from pysolr import Solr
+
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('documents', nargs='+',
+                        help='documents to keep in sync (module.path:DocumentClass)')
+    parser.add_argument('--mongo', required=True, help='mongodb url')
+    parser.add_argument('--solr', required=True, help='solr core url')
+    parser.add_argument('--name', default='default', help='name of the checkpoint')
+    parser.add_argument('--batch-size', type=int, default=500)
+    parser.add_argument('--max-delay', type=float, default=1.0)
+    args = parser.parse_args(argv)
+
+    document_classes = []
+    for document in args.documents:
+        module, cls_name = document.split(':')
+        document_classes.append(getattr(importlib.import_module(module), cls_name))
+
+    mongoengine.connect(host=args.mongo)
+    app = Flask(__name__)
+    app.solr = Solr(args.solr)
+    with app.app_context():
+        worker = SolrSyncWorker(document_classes, name=args.name,
+                                batch_size=args.batch_size, max_delay=args.max_delay)
+        try:
+            worker.run()
+        except KeyboardInterrupt:
+            worker.flush()
+    print('[SOLR SYNC] stopped: %s documents indexed, %s removed' %
+          (worker.indexed, worker.removed))
+
+
+if __name__ == '__main__':
+    main()
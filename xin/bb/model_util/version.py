@@ -1,5 +1,14 @@
-from datetime import datetime
+import io
+import os
+import json
+import gzip
+from datetime import datetime, timedelta
+from collections import OrderedDict
 import mongoengine
+from mongoengine.base.metaclasses import TopLevelDocumentMetaclass
+from bson import json_util
+from pymongo import InsertOne, UpdateOne
+from pymongo.errors import BulkWriteError
 
 
 class ConcurrencyError(Exception):
@@ -17,7 +26,138 @@ def _get_current_user():
     #     return None
 
 
-class VersionedDocument(mongoengine.Document):
+def _json_diff(old, new, path=()):
+    """
+    Return the list of operations (``['set', path, value]`` or
+    ``['del', path]``) turning the ``old`` json dict into the ``new`` one
+    """
+    ops = []
+    for key in old:
+        if key not in new:
+            ops.append(['del', path + (key, )])
+    for key, value in new.items():
+        if key not in old:
+            ops.append(['set', path + (key, ), value])
+        elif old[key] != value:
+            if isinstance(value, dict) and isinstance(old[key], dict):
+                ops += _json_diff(old[key], value, path + (key, ))
+            else:
+                ops.append(['set', path + (key, ), value])
+    return ops
+
+
+def _mongo_delta_to_json_ops(sets, unsets):
+    """
+    Convert the ``$set``/``$unset`` (as returned by mongoengine's
+    ``Document._delta``) into :func:`_json_diff` style operations
+    """
+    ops = []
+    for key, value in sets.items():
+        ops.append(['set', key.split('.'), json.loads(json_util.dumps(value))])
+    for key in unsets:
+        ops.append(['del', key.split('.')])
+    return ops
+
+
+def _json_patch(doc, ops):
+    """
+    Apply in place the operations generated by :func:`_json_diff` or
+    :func:`_mongo_delta_to_json_ops`
+    """
+    for op in ops:
+        target = doc
+        for key in op[1][:-1]:
+            if isinstance(target, list):
+                target = target[int(key)]
+            else:
+                target = target.setdefault(key, {})
+        key = op[1][-1]
+        if isinstance(target, list):
+            # Same behaviour than mongo's $set/$unset on array elements
+            key = int(key)
+            if key >= len(target):
+                target.extend([None] * (key + 1 - len(target)))
+            target[key] = op[2] if op[0] == 'set' else None
+        elif op[0] == 'set':
+            target[key] = op[2]
+        else:
+            target.pop(key, None)
+    return doc
+
+
+def _retained_history_versions(items, policy, now):
+    """
+    Return the versions of the given history items (of a single origin,
+    ordered by version) retained by the policy
+    """
+    retained = {item.version for item in items if item.action == 'DELETE'}
+    keep_last = policy.get('keep_last')
+    if keep_last:
+        retained.update(item.version for item in items[-keep_last:])
+    keep_days = policy.get('keep_days')
+    if keep_days is not None:
+        limit = now - timedelta(days=keep_days)
+        retained.update(item.version for item in items if item.date >= limit)
+    if policy.get('daily', True):
+        # Last version of each day
+        days = {}
+        for item in items:
+            days[item.date.date()] = item.version
+        retained.update(days.values())
+    return retained
+
+
+def _open_history_archive(path, compression):
+    if compression == 'zstd':
+        try:
+            import zstandard
+        except ImportError:
+            raise RuntimeError('zstandard package is required for zstd compression')
+        return io.TextIOWrapper(zstandard.ZstdCompressor().stream_writer(
+            open(path + '.zst', 'wb')), encoding='utf-8')
+    elif compression == 'gzip':
+        return gzip.open(path + '.gz', 'wt')
+    raise ValueError('Unknown compression %s' % compression)
+
+
+def _dispatch_pre_save(sender, **kwargs):
+    for hook in sender._meta['_hooks']['pre_save']:
+        hook(sender, **kwargs)
+
+
+def _dispatch_post_save(sender, **kwargs):
+    for hook in sender._meta['_hooks']['post_save']:
+        hook(sender, **kwargs)
+
+
+def _dispatch_post_delete(sender, **kwargs):
+    for hook in sender._meta['_hooks']['post_delete']:
+        hook(sender, **kwargs)
+
+
+class HookedDocumentMetaclass(TopLevelDocumentMetaclass):
+
+    """
+    Resolve the save/delete hooks of each concrete document class once at
+    class creation (see :meth:`VersionedDocument._collect_hooks`), each
+    signal then has a single receiver per class and building a document
+    doesn't involve any bootstrap
+    """
+
+    def __new__(mcs, name, bases, attrs):
+        cls = super().__new__(mcs, name, bases, attrs)
+        if not cls._meta.get('abstract'):
+            # mongoengine looks for the parent document by metaclass identity
+            # and would miss the inherited auto id field
+            for base in bases:
+                if isinstance(base, HookedDocumentMetaclass) and not base._meta.get('abstract'):
+                    cls._auto_id_field = getattr(base, '_auto_id_field', False)
+                    break
+            cls._bootstrap_hooks()
+        return cls
+
+
+class VersionedDocument(mongoengine.Document, metaclass=HookedDocumentMetaclass):
 
     """
     Mongoengine abstract document handling version, udpated and created fields
@@ -26,11 +166,27 @@ class VersionedDocument(mongoengine.Document):
     doc_version = mongoengine.IntField(required=True, default=1)
     doc_updated = mongoengine.DateTimeField(default=datetime.utcnow)
     doc_created = mongoengine.DateTimeField(default=datetime.utcnow)
-    meta = {'abstract': True, '_version_bootstrapped': False}
+    meta = {'abstract': True, '_hooks': None}
+
+    @classmethod
+    def _collect_hooks(cls, hooks):
+        """
+        Append to ``hooks`` (dict of ``pre_save``, ``post_save`` and
+        ``post_delete`` lists) the functions to call on the corresponding
+        signals, overload it (calling super) to add hooks
+        """
+        hooks['pre_save'].append(cls._version_pre_save)
 
-    def __init__(self, *args, **kwargs):
-        super().__init__(*args, **kwargs)
-        self._bootstrap_version()
+    @classmethod
+    def _bootstrap_hooks(cls):
+        hooks = {'pre_save': [], 'post_save': [], 'post_delete': []}
+        cls._collect_hooks(hooks)
+        cls._meta['_hooks'] = {name: tuple(funcs) for name, funcs in hooks.items()}
+        for name, dispatch in (('pre_save', _dispatch_pre_save),
+                               ('post_save', _dispatch_post_save),
+                               ('post_delete', _dispatch_post_delete)):
+            if hooks[name]:
+                getattr(mongoengine.signals, name).connect(dispatch, sender=cls)
 
     @staticmethod
     def _version_pre_save(sender, document, **kwargs):
@@ -41,13 +197,6 @@ class VersionedDocument(mongoengine.Document):
             document.doc_updated = datetime.utcnow()
             document.doc_version += 1
 
-    @classmethod
-    def _bootstrap_version(cls):
-        if not cls._meta['_version_bootstrapped']:
-            cls._meta['_version_bootstrapped'] = True
-            # Signal to update metadata on document change
-            mongoengine.signals.pre_save.connect(cls._version_pre_save, sender=cls)
-
     def save(self, *args, **kwargs):
         # Check for race condition on insert
         if self.pk:
@@ -60,26 +209,423 @@ class VersionedDocument(mongoengine.Document):
         except mongoengine.errors.SaveConditionError:
             raise ConcurrencyError()
 
+    def _delta(self):
+        # Keep the changes sent to mongo by the last save for the post
+        # save processing (e.g. history)
+        delta = super()._delta()
+        self._last_delta = delta
+        return delta
+
+    @classmethod
+    def bulk_save(cls, documents, validate=True):
+        """
+        Save multiple documents of the collection in a single request
+
+        As for :meth:`save`, the update of an existing document only
+        succeeds if it hasn't been concurrently modified.
+
+        :param documents: documents to insert (no pk yet) or update
+        :param validate: validate the documents before saving them
+        :return: list of the documents not saved due to a concurrent
+        modification (i.e. those :meth:`save` would raise
+        :class:`ConcurrencyError` for)
+        :raise BulkWriteError: if some writes failed (e.g. duplicate key),
+        raised once the other documents are saved and post processed
+
+        .. note : ``pre_save``/``post_save`` signals are not sent, the
+            post save processing (history, indexing...) is done by batch
+            through :meth:`_bulk_post_save`
+        """
+        documents = list(documents)
+        if validate:
+            for document in documents:
+                document.validate()
+        # Mongo stores dates with millisecond precision, the date identifies
+        # the documents updated by this bulk
+        now = datetime.utcnow()
+        now = now.replace(microsecond=now.microsecond // 1000 * 1000)
+        requests = []
+        created = []
+        updated = OrderedDict()
+        for document in documents:
+            if document.pk:
+                # Same as _version_pre_save
+                previous = (document.doc_version, document.doc_updated)
+                document.doc_updated = now
+                document.doc_version += 1
+                sets, unsets = document._delta()
+                update = {}
+                if sets:
+                    update['$set'] = sets
+                if unsets:
+                    update['$unset'] = unsets
+                updated[document.pk] = (document, previous, len(requests))
+                requests.append(UpdateOne(
+                    {'_id': document.pk, 'doc_version': previous[0]}, update))
+            else:
+                son = document.to_mongo()
+                created.append((document, son, len(requests)))
+                requests.append(InsertOne(son))
+        if not requests:
+            return []
+        error = None
+        try:
+            result = cls._get_collection().bulk_write(requests, ordered=False)
+            matched_count = result.matched_count
+            errors = set()
+        except BulkWriteError as exc:
+            error = exc
+            matched_count = exc.details.get('nMatched', 0)
+            errors = {e['index'] for e in exc.details.get('writeErrors', ())}
+
+        # Documents whose write failed are left untouched
+        failed_created = [c for c in created if c[2] in errors]
+        created = [c for c in created if c[2] not in errors]
+        for document, son, _ in failed_created:
+            son.pop('_id', None)
+        for pk, (document, previous, index) in list(updated.items()):
+            if index in errors:
+                document.doc_version, document.doc_updated = previous
+                del updated[pk]
+
+        failed = []
+        if matched_count < len(updated):
+            # Find out the documents modified in the meantime (another
+            # writer may have set the same version, but not the same date)
+            saved = {son['_id'] for son in cls._get_collection().find(
+                {'$or': [{'_id': pk, 'doc_version': document.doc_version, 'doc_updated': now}
+                         for pk, (document, _, _) in updated.items()]}, {'_id': True})}
+            for pk, (document, previous, _) in list(updated.items()):
+                if pk not in saved:
+                    document.doc_version, document.doc_updated = previous
+                    failed.append(document)
+                    del updated[pk]
+        for document, son, _ in created:
+            document.pk = son['_id']
+            document._created = False
+            document._clear_changed_fields()
+        for document, _, _ in updated.values():
+            document._clear_changed_fields()
+        if created:
+            cls._bulk_post_save([d for d, _, _ in created], created=True)
+        if updated:
+            cls._bulk_post_save([d for d, _, _ in updated.values()], created=False)
+        if error:
+            raise error
+        return failed
+
+    @classmethod
+    def _bulk_post_save(cls, documents, created):
+        """
+        Called by :meth:`bulk_save` with the saved documents, to be
+        extended by subclasses handling ``post_save`` signal
+        """
+        pass
+
 
 class HistorizedDocument(VersionedDocument):
 
     """
     Mongoengine abstract document handling history and race condition
+
+    History stores a full snapshot of the document every
+    ``history_snapshot_interval`` versions (meta param) and only the
+    changes since the previous version otherwise. Set it to 1 to always
+    store full snapshots.
+
+    History items are saved synchronously unless a ``history_writer``
+    (e.g. :class:`BufferedHistoryWriter`) is provided as meta param.
+
+    A ``history_retention`` meta param can limit the history kept by
+    :meth:`apply_history_retention`, e.g.::
+
+        {'keep_last': 10,  # keep the last 10 versions of each document
+         'keep_days': 30,  # keep all the versions from the last 30 days
+         'daily': True}    # only keep the last version of each day otherwise
     """
-    meta = {'abstract': True, 'history_cls': None}
+    meta = {'abstract': True, 'history_cls': None, 'history_snapshot_interval': 20,
+            'history_writer': None, 'history_retention': None}
+
+    @property
+    def history_cls(self):
+        return self._bootstrap_history_cls()
 
-    def __init__(self, *args, **kwargs):
-        super().__init__(*args, **kwargs)
-        self.history_cls = self._bootstrap_history_cls()
-        # Shorthand to get the history of the current document
-        self.get_history = lambda *args, **kwargs: \
-            self.history_cls.objects(*args, origin=self, **kwargs).order_by('version')
+    def get_history(self, *args, **kwargs):
+        """Shorthand to get the history of the current document"""
+        return self.history_cls.objects(*args, origin=self, **kwargs).order_by('version')
 
     @classmethod
     def get_collection_history(cls):
         """Return history class for the document's collection"""
         return cls._bootstrap_history_cls()
 
+    @classmethod
+    def get_origin_history_page(cls, origin, after_version=None, limit=20):
+        """
+        Return the history items of a document (may be deleted) ordered by
+        version, starting after ``after_version``
+
+        Unlike skip/limit pagination, the cost of a page doesn't depend
+        on its depth (use the last item's version as next ``after_version``)
+        """
+        history_cls = cls._bootstrap_history_cls()
+        items = history_cls.objects(origin=origin)
+        if after_version is not None:
+            items = items.filter(version__gt=after_version)
+        return list(items.order_by('version').limit(limit))
+
+    def get_history_content(self, version):
+        """
+        Return the content (as a json dict) of the document at the given
+        version, or None if not available
+        """
+        return self.get_origin_history_content(self.pk, version)
+
+    @classmethod
+    def get_origin_history_content(cls, origin, version):
+        """
+        Return the content (as a json dict) of the document (may be deleted)
+        at the given version by replaying the changes from the nearest
+        snapshot, or None if not available
+        """
+        history_cls = cls._bootstrap_history_cls()
+        items = history_cls.objects(origin=origin, version__lte=version,
+                                    action__ne='DELETE').order_by('-version')
+        deltas = []
+        expected_version = version
+        for item in items.only('version', 'content', 'delta'):
+            if item.version != expected_version:
+                # Missing version, cannot rebuild the content
+                return None
+            if item.content is not None:
+                content = json.loads(item.content)
+                for delta in reversed(deltas):
+                    _json_patch(content, json.loads(delta))
+                return content
+            deltas.append(item.delta)
+            expected_version -= 1
+        return None
+
+    @classmethod
+    def fill_history_contents(cls, origin, items):
+        """
+        Set the content of the given history items (of a single document,
+        ordered by version) stored as delta, replaying the deltas within the
+        items and rebuilding the content preceding them from the history
+
+        .. note : Only meant for display, the items must not be saved back
+        """
+        content = None
+        previous_version = None
+        for item in items:
+            if item.content is not None:
+                content = json.loads(item.content)
+            elif item.delta is None:
+                # Deleted document
+                content = None
+            elif content is not None and previous_version == item.version - 1:
+                content = _json_patch(content, json.loads(item.delta))
+                item.content = json.dumps(content)
+            else:
+                content = cls.get_origin_history_content(origin, item.version)
+                if content is not None:
+                    item.content = json.dumps(content)
+            previous_version = item.version
+        return items
+
+    @classmethod
+    def iter_collection_at(cls, date, batch_size=500):
+        """
+        Generator of the content (as json dicts) of all the documents of
+        the collection as they were at the given date, rebuilt from the
+        history (documents deleted at this date are skipped)
+
+        Use ``cls.from_json(json.dumps(content))`` to get the document
+        out of a content.
+
+        :param date: point in time to read the collection at
+        :param batch_size: number of documents rebuilt per history query
+        """
+        history_cls = cls._bootstrap_history_cls()
+        # For each document: last version and last snapshot at this date
+        states = history_cls.objects(date__lte=date).aggregate(
+            {'$sort': {'origin': 1, 'version': 1}},
+            {'$group': {
+                '_id': '$origin',
+                'version': {'$last': '$version'},
+                'action': {'$last': '$action'},
+                'snapshot': {'$max': {'$cond': [
+                    {'$ifNull': ['$content', False]}, '$version', 0]}}
+            }},
+            {'$match': {'action': {'$ne': 'DELETE'}, 'snapshot': {'$gt': 0}}},
+            {'$sort': {'_id': 1}},
+            allowDiskUse=True)
+        batch = []
+        for state in states:
+            batch.append(state)
+            if len(batch) >= batch_size:
+                yield from cls._rebuild_history_contents(history_cls, batch)
+                batch = []
+        if batch:
+            yield from cls._rebuild_history_contents(history_cls, batch)
+
+    @staticmethod
+    def _rebuild_history_contents(history_cls, states):
+        # Retrieve in one query the snapshot and following deltas of each
+        # document, then replay them
+        query = {'$or': [{'origin': state['_id'],
+                          'version': {'$gte': state['snapshot'], '$lte': state['version']}}
+                         for state in states]}
+        items = history_cls._get_collection().find(
+            query, {'origin': True, 'content': True, 'delta': True}).sort(
+            [('origin', 1), ('version', 1)])
+        origin = content = None
+        for item in items:
+            if item['origin'] != origin:
+                if content is not None:
+                    yield content
+                origin = item['origin']
+                content = None
+            if item.get('content') is not None:
+                content = json.loads(item['content'])
+            elif item.get('delta') is not None and content is not None:
+                content = _json_patch(content, json.loads(item['delta']))
+        if content is not None:
+            yield content
+
+    @classmethod
+    def compact_history(cls, origin=None):
+        """
+        Convert the full contents stored in history into snapshots and
+        deltas according to ``history_snapshot_interval``
+
+        :param origin: only compact the history of this document
+        :return: number of items converted to delta
+        """
+        history_cls = cls._bootstrap_history_cls()
+        interval = cls._meta.get('history_snapshot_interval')
+        if not interval or interval <= 1:
+            return 0
+        items = history_cls.objects(action__ne='DELETE').order_by('origin', 'version')
+        if origin is not None:
+            items = items.filter(origin=origin)
+        compacted = 0
+        previous = None
+        items = items.only('origin', 'version', 'content', 'delta').no_dereference().no_cache()
+        for item in items:
+            origin_id = item.origin.id
+            follows = (previous and previous[0] == origin_id and
+                       previous[1] == item.version - 1)
+            if item.content is None:
+                # Already a delta, keep track of the content
+                if follows:
+                    content = _json_patch(previous[2], json.loads(item.delta))
+                    previous = (origin_id, item.version, content)
+                else:
+                    previous = None
+                continue
+            content = json.loads(item.content)
+            if follows and (item.version - 1) % interval:
+                delta = _json_diff(previous[2], content)
+                item.update(set__delta=json.dumps(delta), unset__content=True)
+                compacted += 1
+            previous = (origin_id, item.version, content)
+        return compacted
+
+    @classmethod
+    def apply_history_retention(cls, archive_dir=None, compression='gzip', batch_size=500,
+                                now=None):
+        """
+        Remove the history items not retained by the ``history_retention``
+        meta param
+
+        Retained items following removed ones are converted into full
+        snapshots. Removed items can be archived (with their full content)
+        as a json-lines file compressed with ``gzip`` or ``zstd`` (requires
+        the ``zstandard`` package).
+
+        :param archive_dir: directory where the archive file is created
+        :param compression: archive compression, ``gzip`` or ``zstd``
+        :param batch_size: number of items removed per request
+        :param now: reference date for the retention (default to utcnow)
+        :return: dict of the number of processed origins, removed and
+        converted items
+        """
+        policy = cls._meta.get('history_retention')
+        if not policy:
+            raise NotImplementedError('No history_retention setted for this document')
+        history_cls = cls._bootstrap_history_cls()
+        now = now or datetime.utcnow()
+        stats = {'origins': 0, 'removed': 0, 'converted': 0}
+        archive = None
+        if archive_dir:
+            archive = _open_history_archive(os.path.join(archive_dir, '%s-%s.jsonl' % (
+                history_cls._get_collection_name(), now.strftime('%Y%m%dT%H%M%S'))), compression)
+        removed = []
+
+        def flush_removed():
+            if removed:
+                history_cls.objects(id__in=removed).delete()
+                stats['removed'] += len(removed)
+                del removed[:]
+
+        def process(items):
+            stats['origins'] += 1
+            retained = _retained_history_versions(items, policy, now)
+            content = None
+            previous_retained = None
+            origin_removed = []
+            for item in items:
+                # Replay the history to have the content at each version
+                if item.content is not None:
+                    content = json.loads(item.content)
+                elif item.delta is not None:
+                    if content is not None:
+                        content = _json_patch(content, json.loads(item.delta))
+                if item.version in retained:
+                    if (item.delta is not None and content is not None and
+                            previous_retained != item.version - 1):
+                        item.update(set__content=json.dumps(content), unset__delta=True)
+                        stats['converted'] += 1
+                    previous_retained = item.version
+                    continue
+                if archive:
+                    son = item.to_mongo()
+                    son.pop('delta', None)
+                    if content is not None:
+                        son['content'] = json.dumps(content)
+                    archive.write(json_util.dumps(son) + '\n')
+                origin_removed.append(item.id)
+            # Removed only once all the retained items relying on them have
+            # been converted, so an interruption doesn't lose any content
+            for item_id in origin_removed:
+                removed.append(item_id)
+                if len(removed) >= batch_size:
+                    flush_removed()
+
+        try:
+            items = history_cls.objects.order_by('origin', 'version').no_dereference().no_cache()
+            origin_items = []
+            for item in items:
+                if origin_items and origin_items[0].origin.id != item.origin.id:
+                    process(origin_items)
+                    origin_items = []
+                origin_items.append(item)
+            if origin_items:
+                process(origin_items)
+            flush_removed()
+        finally:
+            if archive:
+                archive.close()
+        return stats
+
+    @classmethod
+    def _collect_hooks(cls, hooks):
+        super()._collect_hooks(hooks)
+        cls._bootstrap_history_cls()
+        hooks['post_save'].append(cls._history_post_save)
+        hooks['post_delete'].append(cls._history_post_delete)
+
     @staticmethod
     def _history_post_delete(sender, document):
         """Create HistoryItem on delete"""
@@ -88,20 +634,53 @@ class HistorizedDocument(VersionedDocument):
         item = history_cls(origin=document, author=_get_current_user(),
                            action='DELETE', version=version,
                            date=datetime.utcnow())
-        item.save()
+        sender._write_history(item)
 
     @staticmethod
     def _history_post_save(sender, document, created):
         """Create HistoryItem document modification"""
-        history_cls = sender._meta['history_cls']
+        sender._write_history(sender._build_history_item(document, created))
+
+    @classmethod
+    def _bulk_post_save(cls, documents, created):
+        super()._bulk_post_save(documents, created)
+        items = OrderedDict()
+        for document in documents:
+            sender = type(document)
+            items.setdefault(sender, []).append(sender._build_history_item(document, created))
+        for sender, sender_items in items.items():
+            sender._write_history(*sender_items)
+
+    @classmethod
+    def _build_history_item(cls, document, created):
+        history_cls = cls._bootstrap_history_cls()
+        interval = cls._meta.get('history_snapshot_interval')
+        version = document.doc_version
+        # Changes sent to mongo by the save (only the modified fields)
+        changes = getattr(document, '_last_delta', None)
+        document._last_delta = None
         item = history_cls(origin=document,
                            author=_get_current_user(),
                            action='CREATE' if created else 'UPDATE',
-                           # content=document.to_mongo().to_dict(),
-                           content=document.to_json(),
-                           version=document.doc_version,
+                           version=version,
                            date=document.doc_updated)
-        item.save()
+        if (created or changes is None or not interval or interval <= 1 or
+                not (version - 1) % interval):
+            item.content = document.to_json()
+        else:
+            item.delta = json.dumps(_mongo_delta_to_json_ops(*changes))
+        return item
+
+    @classmethod
+    def _write_history(cls, *items):
+        writer = cls._meta.get('history_writer')
+        if writer:
+            for item in items:
+                writer.write(item)
+        elif len(items) == 1:
+            items[0].save()
+        else:
+            cls._bootstrap_history_cls().objects.insert(items, load_bulk=False)
 
     @classmethod
     def _bootstrap_history_cls(cls):
@@ -112,11 +691,18 @@ class HistorizedDocument(VersionedDocument):
 
         # Create history class with a dynamic name
         HistoryItem = type(cls.__name__ + 'History', (mongoengine.Document, ), {
-            'meta': {'collection': collection},
+            'meta': {
+                'collection': collection,
+                # For origin's history (and its keyset pagination) and date queries
+                'indexes': [('origin', 'version'), 'date']
+            },
             'origin': mongoengine.ReferenceField(cls, required=True),
             'author': mongoengine.ReferenceField('User'),
             # 'content': mongoengine.DictField(),
+            # Full snapshot of the document...
             'content': mongoengine.StringField(),
+            # ...or changes since the previous version
+            'delta': mongoengine.StringField(),
             'action': mongoengine.StringField(
                 choices=['CREATE', 'UPDATE', 'DELETE'], required=True),
             'version': mongoengine.IntField(required=True),
@@ -124,7 +710,4 @@ class HistorizedDocument(VersionedDocument):
         })
 
         cls._meta['history_cls'] = HistoryItem
-        # Register signals to trigger history creation
-        mongoengine.signals.post_save.connect(cls._history_post_save, sender=cls)
-        mongoengine.signals.post_delete.connect(cls._history_post_delete, sender=cls)
-        return cls._meta['history_cls']
+        return HistoryItem
@@ -0,0 +1,90 @@
+import os
+import fcntl
+import atexit
+
+import pytest
+from bson import ObjectId, json_util
+
+from xin.bb.model_util import history_writer
+from xin.bb.model_util.history_writer import BufferedHistoryWriter
+
+
+class FakeCollection:
+
+    def __init__(self):
+        self.inserted = []
+
+    def insert_many(self, sons, ordered=True):
+        self.inserted += sons
+
+
+def _write_journal(path, ids, end=''):
+    with open(path, 'w') as fd:
+        for _id in ids:
+            fd.write(json_util.dumps(('default', 'doc.history', {'_id': _id})) + '\n')
+        fd.write(end)
+    open(path.rsplit('.flushing', 1)[0] + '.lock', 'a').close()
+
+
+class TestBufferedHistoryWriter:
+
+    def setup_method(self, method):
+        self.collection = FakeCollection()
+        self.dbs = []
+
+    def get_db(self, alias):
+        self.dbs.append(alias)
+        return {'doc.history': self.collection}
+
+    def test_lazy_recovery(self, tmpdir, monkeypatch):
+        journal = str(tmpdir.join('history.journal'))
+        ids = [ObjectId() for _ in range(3)]
+        # Left by a dead process
+        _write_journal(journal + '.12345.flushing', ids[:1])
+        _write_journal(journal + '.12345', ids[1:])
+        monkeypatch.setattr(history_writer, 'get_db', self.get_db)
+        writer = BufferedHistoryWriter(journal=journal)
+        # Database may not be connected yet
+        assert not self.dbs
+        assert writer.recover() == 3
+        assert self.dbs == ['default']
+        assert [son['_id'] for son in self.collection.inserted] == ids
+        assert not len(writer)
+        assert sorted(os.listdir(str(tmpdir))) == [
+            'history.journal.%s' % os.getpid(), 'history.journal.%s.lock' % os.getpid()]
+        assert tmpdir.join('history.journal.%s' % os.getpid()).read() == ''
+
+    def test_running_process_journal(self, tmpdir, monkeypatch):
+        journal = str(tmpdir.join('history.journal'))
+        _write_journal(journal + '.12345', [ObjectId()])
+        monkeypatch.setattr(history_writer, 'get_db', self.get_db)
+        writer = BufferedHistoryWriter(journal=journal)
+        with open(journal + '.12345.lock', 'a') as lock_fd:
+            fcntl.flock(lock_fd, fcntl.LOCK_EX)
+            assert writer.recover() == 0
+        assert tmpdir.join('history.journal.12345').exists()
+        other_writer = BufferedHistoryWriter(journal=journal)
+        atexit.unregister(other_writer.flush)
+        with pytest.raises(RuntimeError):
+            other_writer.recover()
+        # Process 12345 died, the writer is then used by a forked process
+        monkeypatch.setattr(history_writer.os, 'getpid', lambda: 23456)
+        assert writer.recover() == 1
+        assert not tmpdir.join('history.journal.12345').exists()
+
+    def test_truncated_journal(self, tmpdir, monkeypatch):
+        journal = str(tmpdir.join('history.journal'))
+        path = '%s.%s' % (journal, os.getpid())
+        _write_journal(path, [ObjectId()], end='["default", "doc.hi')
+        monkeypatch.setattr(history_writer, 'get_db', self.get_db)
+        writer = BufferedHistoryWriter(journal=journal)
+        writer.recover()
+        assert len(self.collection.inserted) == 1
+        assert not os.path.exists(path + '.flushing')
+        # Truncated before appending the new items
+        writer.write(type('Item', (), {
+            'id': None, '_meta': {}, 'validate': lambda self: None,
+            'to_mongo': lambda self: {}, '_get_collection_name': lambda self: 'doc.history'})())
+        with open(path) as fd:
+            assert len([json_util.loads(line) for line in fd]) == 1
+        writer.flush()
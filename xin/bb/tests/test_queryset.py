@@ -0,0 +1,147 @@
+import pytest
+import mongoengine
+
+from xin.bb.model_util.queryset import (
+    ReadOnlyDocument, DocumentQuerySet, DocumentQuerySetNoCache)
+
+
+class Field:
+
+    def __init__(self, db_field, default=None):
+        self.db_field = db_field
+        self.default = default
+        self.converted = 0
+
+    def to_python(self, value):
+        self.converted += 1
+        return value.upper()
+
+
+class FakeDocument:
+
+    _fields = {'id': Field('_id'), 'name': Field('name'),
+               'kind': Field('kind', default=lambda: 'default')}
+    _meta = {'id_field': 'id'}
+
+
+class TestReadOnlyDocument:
+
+    def test_lazy_conversion(self):
+        doc = ReadOnlyDocument(FakeDocument, {'_id': 'abc', 'name': 'john'})
+        name_field = FakeDocument._fields['name']
+        assert name_field.converted == 0
+        assert doc.name == 'JOHN'
+        assert doc.name == 'JOHN'
+        assert name_field.converted == 1
+        assert doc.pk == doc.id == 'ABC'
+        assert doc.kind == 'default'
+
+    def test_read_only(self):
+        doc = ReadOnlyDocument(FakeDocument, {'_id': 'abc'})
+        for name in ('name', 'other'):
+            with pytest.raises(AttributeError):
+                setattr(doc, name, 'value')
+        with pytest.raises(AttributeError):
+            doc.other
+
+
+class FakeCursor:
+
+    def __init__(self, sons):
+        self.sons = sons
+        self._skip = 0
+        self._limit = 0
+        self._iter = None
+
+    def __getitem__(self, key):
+        if isinstance(key, slice):
+            self._skip = key.start or 0
+            self._limit = key.stop - self._skip if key.stop is not None else 0
+            return self
+        return self.sons[self._skip + key]
+
+    def clone(self):
+        cursor = FakeCursor(self.sons)
+        cursor._skip, cursor._limit = self._skip, self._limit
+        return cursor
+
+    def sort(self, ordering):
+        return self
+
+    def limit(self, limit):
+        self._limit = limit
+        return self
+
+    def skip(self, skip):
+        self._skip = skip
+        return self
+
+    def hint(self, hint):
+        return self
+
+    def rewind(self):
+        self._iter = None
+        return self
+
+    def __next__(self):
+        if self._iter is None:
+            stop = self._skip + self._limit if self._limit else None
+            self._iter = iter(self.sons[self._skip:stop])
+        return next(self._iter)
+
+    next = __next__
+
+
+class FakeCollection:
+
+    def __init__(self, sons):
+        self.sons = sons
+
+    def find(self, query, **kwargs):
+        return FakeCursor(self.sons)
+
+
+class QuerySetDocument(mongoengine.Document):
+    meta = {'queryset_class': DocumentQuerySet}
+    name = mongoengine.StringField()
+
+
+class TestDocumentQuerySet:
+
+    def setup_method(self, method):
+        self.collection = FakeCollection(
+            [{'_id': i, 'name': 'doc-%s' % i} for i in range(50)])
+
+    def test_read_only(self):
+        queryset = DocumentQuerySet(QuerySetDocument, self.collection)
+        docs = list(queryset.read_only())
+        assert len(docs) == 50
+        assert all(isinstance(doc, ReadOnlyDocument) for doc in docs)
+        assert docs[3].name == 'doc-3'
+        document = docs[3].to_document()
+        assert isinstance(document, QuerySetDocument)
+        assert (document.pk, document.name) == (3, 'doc-3')
+        assert all(isinstance(doc, QuerySetDocument) for doc in queryset)
+
+    def test_read_only_slice(self):
+        queryset = DocumentQuerySet(QuerySetDocument, self.collection)
+        docs = list(queryset.read_only()[0:20])
+        assert [doc.pk for doc in docs] == list(range(20))
+        assert all(isinstance(doc, ReadOnlyDocument) for doc in docs)
+        docs = list(queryset.read_only().skip(10).limit(5))
+        assert [doc.name for doc in docs] == ['doc-%s' % i for i in range(10, 15)]
+        doc = queryset.read_only()[5]
+        assert isinstance(doc, ReadOnlyDocument) and doc.pk == 5
+        assert isinstance(queryset[5], QuerySetDocument)
+
+    def test_read_only_no_cache(self):
+        queryset = DocumentQuerySet(QuerySetDocument, self.collection)
+        for no_cache in (queryset.read_only().no_cache(), queryset.no_cache().read_only()):
+            assert isinstance(no_cache, DocumentQuerySetNoCache)
+            docs = list(no_cache)
+            assert len(docs) == 50
+            assert all(isinstance(doc, ReadOnlyDocument) for doc in docs)
+            cache = no_cache.cache()
+            assert isinstance(cache, DocumentQuerySet)
+            assert all(isinstance(doc, ReadOnlyDocument) for doc in cache)
+        assert all(isinstance(doc, QuerySetDocument) for doc in queryset.no_cache())
@@ -0,0 +1,314 @@
+import time
+import random
+from types import SimpleNamespace
+import mongoengine
+import pytest
+
+from xin.bb.model_util.searcher import (
+    BaseSolrSearcher, StringFieldSolrConverter, SolrIndexBuffer, get_solr_doc_id)
+from xin.bb.model_util.result_cache import SolrResultCache
+
+
+class Reference:
+
+    def __init__(self, id):
+        self.id = id
+
+
+class FakeDocument:
+
+    _class_name = 'FakeDocument.Child'
+    VALUES = (None, 0, '', 'value', 42, [], ['a', None, ''], ('b', ),
+              [Reference(1), Reference(2)], Reference(3))
+
+    def __init__(self, rand):
+        self.pk = self.id = rand.randint(1, 1000)
+        self.doc_version = rand.choice((0, 1, 2))
+        self.doc_updated = None
+        self.doc_created = 'now'
+        for field in 'abcdefg':
+            setattr(self, field, rand.choice(self.VALUES))
+
+
+class ReprConverter(StringFieldSolrConverter):
+
+    def _serialize(self, value):
+        return {self._solr_field_name: repr(value), 'extra_s': True}
+
+
+class FakeSearcher(BaseSolrSearcher):
+
+    def __init__(self):
+        super().__init__(FakeDocument)
+        fields = mongoengine.fields
+        self.build_and_register_converter('a', fields.StringField())
+        self.build_and_register_converter('b', fields.ListField(fields.StringField()))
+        self.build_and_register_converter('c', fields.ReferenceField('FakeDocument'))
+        self.build_and_register_converter(
+            'd', fields.ListField(fields.ReferenceField('FakeDocument')))
+        self.build_and_register_converter('e', fields.IntField(), aliases=('alias_e', ))
+        self.converters.append(ReprConverter('f', multi=True))
+        self.converters.append(ReprConverter('g'))
+        # Override a previous converter's field
+        self.converters.append(ReprConverter('a', solr_field_name='b_ss'))
+
+
+def _reference_solr_doc(searcher, document):
+    sdoc = {'id': get_solr_doc_id(document)}
+    for c in searcher.converters:
+        sdoc.update(c.build_solr(document))
+    return sdoc
+
+
+class TestSearcher:
+
+    def test_compiled_solr_doc_builder(self):
+        rand = random.Random(42)
+        searcher = FakeSearcher()
+        for _ in range(2000):
+            document = FakeDocument(rand)
+            try:
+                expected = _reference_solr_doc(searcher, document)
+            except AttributeError as exc:
+                expected = type(exc)
+            try:
+                generated = searcher.generate_solr_doc(document)
+            except AttributeError as exc:
+                generated = type(exc)
+            assert generated == expected
+
+    def test_replace_aliases(self):
+        searcher = FakeSearcher()
+        assert (searcher._replace_aliases('_version:3 AND id:4 AND alias_e:[1 TO 2]') ==
+                'doc_version_i:3 AND doc_id:4 AND e_i:[1 TO 2]')
+        # Not a standalone word, must not be replaced
+        assert searcher._replace_aliases('my_version:3') == 'my_version:3'
+
+    def test_replace_aliases_new_converter(self):
+        searcher = FakeSearcher()
+        assert searcher._replace_aliases('h:1') == 'h:1'
+        searcher.build_and_register_converter('h', mongoengine.fields.IntField())
+        assert searcher._replace_aliases('h:1') == 'h_i:1'
+
+    def test_nested_fields_converter(self):
+        fields = mongoengine.fields
+
+        class Address(mongoengine.EmbeddedDocument):
+            city = fields.StringField()
+            zipcodes = fields.ListField(fields.IntField())
+
+        class Document:
+            _class_name = 'Document'
+            pk = id = 1
+            address = Address(city='Paris', zipcodes=[75001, 75002])
+            addresses = [Address(city='Lyon', zipcodes=[69001]), Address(zipcodes=[1])]
+            tags = [['a', 'b'], [], ['c']]
+
+        searcher = BaseSolrSearcher(Document)
+        searcher.build_and_register_converter(
+            'address.city', fields.EmbeddedDocumentField(Address))
+        searcher.build_and_register_converter(
+            'addresses.zipcodes', fields.ListField(fields.EmbeddedDocumentField(Address)))
+        searcher.build_and_register_converter(
+            'tags', fields.ListField(fields.ListField(fields.StringField())))
+        sdoc = searcher.generate_solr_doc(Document)
+        assert sdoc['address_city_s'] == 'Paris'
+        assert sdoc['addresses_zipcodes_is'] == [69001, 1]
+        assert sdoc['tags_ss'] == ['a', 'b', 'c']
+        assert searcher._replace_aliases('address.city:Paris') == 'address_city_s:Paris'
+
+    def test_nested_fields_declaration(self):
+        fields = mongoengine.fields
+
+        class Address(mongoengine.EmbeddedDocument):
+            city = fields.StringField()
+
+        class Document:
+            _class_name = 'Document'
+            address = fields.EmbeddedDocumentField(Address)
+
+        class NestedSearcher(BaseSolrSearcher):
+            FIELDS = ('address.city', 'unknown')
+
+        document = SimpleNamespace(_class_name='Document', pk=1, id=1,
+                                   address=Address(city='Paris'))
+        searcher = NestedSearcher(Document)
+        assert searcher.generate_solr_doc(document)['address_city_s'] == 'Paris'
+
+    def test_result_cache(self):
+
+        class Results(list):
+            hits = 42
+
+        class CachedSearcher(BaseSolrSearcher):
+            RESULT_CACHE = SolrResultCache()
+            calls = 0
+
+            def solr_search(self, q, **kwargs):
+                self.calls += 1
+                return Results([{'doc_id': '1'}, {'doc_id': '2'}])
+
+        searcher = CachedSearcher(FakeDocument)
+        assert searcher._cached_solr_search('*:*', fq=['a_s:x']) == (['1', '2'], 42, None, {})
+        assert searcher._cached_solr_search('*:*', fq=['a_s:x']) == (('1', '2'), 42, None, {})
+        assert searcher.calls == 1
+        searcher._cached_solr_search('*:*', fq=['a_s:x'], start=20)
+        assert searcher.calls == 2
+        searcher._invalidate_results()
+        searcher._cached_solr_search('*:*', fq=['a_s:x'])
+        assert searcher.calls == 3
+        assert searcher.RESULT_CACHE.stats() == {'hits': 1, 'misses': 3, 'invalidations': 1}
+
+    def test_search_from_solr_fields(self):
+
+        class Results(list):
+            hits = 1
+
+        class StoredSearcher(FakeSearcher):
+
+            def solr_search(self, q, **kwargs):
+                self.kwargs = kwargs
+                return Results([{'id': 'FakeDocument-1', 'doc_id': '1', 'e_i': 2,
+                                 'doc_version_i': 3, '_version_': 123,
+                                 'doc_type': 'FakeDocument.Child',
+                                 'doc_base_type': 'FakeDocument'}])
+
+        searcher = StoredSearcher()
+        items, hits, _, _ = searcher._solr_search_fields('*:*', only=('e', '_class_name'))
+        assert set(searcher.kwargs['fl'].split(',')) == {'doc_id', 'e_i', 'doc_type'}
+        assert hits == 1
+        assert items == [{'id': '1', 'e': 2, 'doc_version': 3,
+                          '_class_name': 'FakeDocument.Child'}]
+
+    def test_iter_solr_search_cursor(self):
+
+        class Results(list):
+            pass
+
+        class CursorSearcher(FakeSearcher):
+            pages = {'*': 'AoE1', 'AoE1': 'AoE2', 'AoE2': 'AoE2'}
+
+            def solr_search(self, q, **kwargs):
+                assert kwargs['sort'] == ['e_i desc', 'id asc']
+                results = Results([{'doc_id': kwargs['cursorMark']}])
+                results.nextCursorMark = self.pages[kwargs['cursorMark']]
+                return results
+
+        searcher = CursorSearcher()
+        pages = list(searcher.iter_solr_search('*:*', sort=['e_i desc']))
+        assert [p[0]['doc_id'] for p in pages] == ['*', 'AoE1', 'AoE2']
+
+    def test_search_last_cursor(self):
+
+        class Results(list):
+            hits = 1
+
+        class CursorSearcher(FakeSearcher):
+
+            def solr_search(self, q, **kwargs):
+                results = Results([{'doc_id': '1', 'e_i': 2}])
+                results.nextCursorMark = 'AoE2'
+                return results
+
+        searcher = CursorSearcher()
+        result = searcher.search_or_abort('*:*', cursor='*', from_solr=True)
+        assert result['_meta']['next_cursor'] == 'AoE2'
+        # Same cursor returned by solr means no more results
+        result = searcher.search_or_abort('*:*', cursor='AoE2', from_solr=True)
+        assert 'next_cursor' not in result['_meta']
+
+    def test_facets(self):
+        searcher = FakeSearcher()
+        params = {}
+        names = searcher._build_facet_params(
+            params, facets=['a', '_version'], range_facets={'alias_e': (0, 100, 10)})
+        assert params['facet.field'] == ['a_s', 'doc_version_i']
+        assert params['facet.range'] == ['e_i']
+        assert params['f.e_i.facet.range.gap'] == 10
+        facets = searcher._parse_facets({
+            'facet_fields': {'a_s': ['x', 3, 'y', 1], 'doc_version_i': []},
+            'facet_ranges': {'e_i': {'counts': ['0', 2, '10', 5], 'gap': 10}}
+        }, names)
+        assert facets == {'a': {'x': 3, 'y': 1}, '_version': {}, 'alias_e': {'0': 2, '10': 5}}
+        assert list(facets['a']) == ['x', 'y']
+
+
+class FakeSolr:
+
+    def __init__(self):
+        self.adds = []
+        self.deletes = []
+        self.fail = False
+
+    def add(self, sdocs, **kwargs):
+        if self.fail:
+            raise IOError('solr down')
+        self.adds.extend(sdocs)
+
+    def delete(self, id=None, q=None, **kwargs):
+        assert id is None, 'pysolr only deletes a single id'
+        self.deletes.append(q)
+
+
+class TestSolrIndexBuffer:
+
+    def test_flush(self):
+        solr = FakeSolr()
+        buffer = SolrIndexBuffer(solr=solr, max_size=10)
+        buffer.add({'id': 'Doc-1'})
+        buffer.add({'id': 'Doc-2'})
+        buffer.delete('Doc-1')
+        buffer.delete('Doc-"3"')
+        buffer.flush()
+        assert solr.adds == [{'id': 'Doc-2'}]
+        assert len(solr.deletes) == 1
+        assert solr.deletes[0].startswith('id:(')
+        assert '"Doc-1"' in solr.deletes[0] and '"Doc-\\"3\\""' in solr.deletes[0]
+        assert not len(buffer)
+
+    def test_requeue_on_failure(self):
+        solr = FakeSolr()
+        buffer = SolrIndexBuffer(solr=solr, max_size=10)
+        buffer.add({'id': 'Doc-1'})
+        buffer.delete('Doc-2')
+        solr.fail = True
+        with pytest.raises(IOError):
+            buffer.flush()
+        assert len(buffer) == 2
+        solr.fail = False
+        buffer.flush()
+        assert solr.adds == [{'id': 'Doc-1'}]
+        assert not len(buffer)
+
+    def test_flush_on_delay(self):
+        solr = FakeSolr()
+        buffer = SolrIndexBuffer(solr=solr, max_delay=0.05)
+        buffer.add({'id': 'Doc-1'})
+        assert not solr.adds
+        # No other operation needed to trigger the flush
+        time.sleep(0.2)
+        assert solr.adds == [{'id': 'Doc-1'}]
+        assert not len(buffer)
+
+    def test_flush_outside_app_context(self, monkeypatch):
+        import xin.bb.model_util.searcher as searcher_module
+        solr = FakeSolr()
+        buffer = SolrIndexBuffer(max_delay=60)
+        monkeypatch.setattr(searcher_module, 'current_app', type('App', (), {'solr': solr}))
+        buffer.add({'id': 'Doc-1'})
+        other_solr = FakeSolr()
+        monkeypatch.setattr(searcher_module, 'current_app', type('App', (), {'solr': other_solr}))
+        buffer.delete('Doc-2')
+        # App context is over
+        monkeypatch.setattr(searcher_module, 'current_app', None)
+        buffer.flush()
+        assert solr.adds == [{'id': 'Doc-1'}] and not solr.deletes
+        assert other_solr.deletes == ['id:("Doc-2")'] and not other_solr.adds
+
+    def test_clear_collection_ids(self, monkeypatch):
+        import xin.bb.model_util.searcher as searcher_module
+        solr = FakeSolr()
+        monkeypatch.setattr(searcher_module, 'current_app', type('App', (), {'solr': solr}))
+        FakeSearcher().clear_collection(sdoc_ids=['Doc-%s' % i for i in range(1200)])
+        assert len(solr.deletes) == 3
+        assert all(q.count(' OR ') < 500 for q in solr.deletes)
@@ -0,0 +1,312 @@
+import json
+import random
+import itertools
+from datetime import datetime
+from types import SimpleNamespace
+from collections import namedtuple
+
+import pytest
+from pymongo import InsertOne
+from pymongo.errors import BulkWriteError
+
+from xin.bb.model_util.version import (
+    VersionedDocument, HistorizedDocument, _json_diff, _json_patch, _mongo_delta_to_json_ops,
+    _retained_history_versions)
+
+
+def _random_json(rand, depth=0):
+    doc = {}
+    for key in rand.sample('abcdefgh', rand.randint(0, 6)):
+        kind = rand.random()
+        if kind < 0.2 and depth < 3:
+            doc[key] = _random_json(rand, depth + 1)
+        elif kind < 0.4:
+            doc[key] = [rand.randint(0, 3) for _ in range(rand.randint(0, 3))]
+        elif kind < 0.5:
+            doc[key] = None
+        else:
+            doc[key] = rand.choice(('x', 'y', 1, 2, True, {'$oid': '57b2eb6b13adf20e5c9b0a7d'}))
+    return doc
+
+
+class TestHistoryDelta:
+
+    def test_diff_patch_roundtrip(self):
+        rand = random.Random(42)
+        for _ in range(2000):
+            old = _random_json(rand)
+            new = _random_json(rand)
+            delta = json.loads(json.dumps(_json_diff(old, new)))
+            assert _json_patch(json.loads(json.dumps(old)), delta) == new
+
+    def test_diff_is_minimal(self):
+        old = {'a': 1, 'b': {'c': 2, 'd': [1, 2]}, 'e': 'x'}
+        new = {'a': 1, 'b': {'c': 3, 'd': [1, 2]}, 'f': 'y'}
+        assert sorted(_json_diff(old, new)) == sorted([
+            ['del', ('e', )], ['set', ('b', 'c'), 3], ['set', ('f', ), 'y']])
+
+    def test_patch_from_mongo_delta(self):
+        content = {'_id': {'$oid': '57b2eb6b13adf20e5c9b0a7d'}, 'name': 'x',
+                   'tags': ['a', 'b'], 'address': {'city': 'Paris', 'zip': '75001'}}
+        ops = json.loads(json.dumps(_mongo_delta_to_json_ops(
+            {'name': 'y', 'tags.1': 'c', 'address.city': 'Lyon', 'meta.level': 2},
+            {'address.zip': 1, 'tags.0': 1})))
+        assert _json_patch(content, ops) == {
+            '_id': {'$oid': '57b2eb6b13adf20e5c9b0a7d'}, 'name': 'y',
+            'tags': [None, 'c'], 'address': {'city': 'Lyon'}, 'meta': {'level': 2}}
+
+    def test_history_retention(self):
+        Item = namedtuple('Item', ('version', 'date', 'action'))
+        now = datetime(2016, 8, 20, 12)
+        items = [
+            Item(1, datetime(2016, 1, 1, 8), 'CREATE'),
+            Item(2, datetime(2016, 1, 1, 9), 'UPDATE'),
+            Item(3, datetime(2016, 1, 2, 9), 'UPDATE'),
+            Item(4, datetime(2016, 1, 2, 10), 'UPDATE'),
+            Item(5, datetime(2016, 8, 19, 10), 'UPDATE'),
+            Item(6, datetime(2016, 8, 19, 11), 'UPDATE'),
+            Item(7, datetime(2016, 8, 19, 12), 'DELETE'),
+        ]
+        assert _retained_history_versions(items, {'keep_last': 2}, now) == {2, 4, 6, 7}
+        assert _retained_history_versions(
+            items, {'keep_days': 3, 'daily': False}, now) == {5, 6, 7}
+        assert _retained_history_versions(
+            items, {'keep_last': 4, 'daily': False}, now) == {4, 5, 6, 7}
+
+    def test_apply_history_retention_order(self, monkeypatch):
+        operations = []
+
+        class FakeItem:
+
+            def __init__(self, origin, version, content=None, delta=None):
+                self.id = (origin, version)
+                self.origin = SimpleNamespace(id=origin)
+                self.version = version
+                self.action = 'CREATE' if version == 1 else 'UPDATE'
+                self.date = datetime(2016, 1, 1, version)
+                self.content = json.dumps(content) if content is not None else None
+                self.delta = json.dumps(delta) if delta is not None else None
+
+            def update(self, **kwargs):
+                operations.append(('convert', self.id))
+
+        items = [
+            FakeItem(1, 1, content={'a': 1}),
+            FakeItem(1, 2, delta=[['set', ['a'], 2]]),
+            FakeItem(1, 3, delta=[['set', ['a'], 3]]),
+            FakeItem(1, 4, delta=[['set', ['a'], 4]]),
+            FakeItem(2, 1, content={'b': 1}),
+            FakeItem(2, 2, delta=[['set', ['b'], 2]]),
+            FakeItem(2, 3, delta=[['set', ['b'], 3]]),
+        ]
+
+        class FakeQuerySet(list):
+
+            def order_by(self, *keys):
+                return self
+
+            def no_dereference(self):
+                return self
+
+            no_cache = no_dereference
+
+        class FakeObjects:
+
+            def __call__(self, id__in):
+                ids = list(id__in)
+                return SimpleNamespace(delete=lambda: operations.append(('delete', ids)))
+
+            def order_by(self, *keys):
+                return FakeQuerySet(items)
+
+        FakeHistory = SimpleNamespace(objects=FakeObjects())
+        monkeypatch.setitem(HistorizedDocument._meta, 'history_retention',
+                            {'keep_last': 2, 'daily': False})
+        monkeypatch.setattr(HistorizedDocument, '_bootstrap_history_cls',
+                            classmethod(lambda cls: FakeHistory))
+        stats = HistorizedDocument.apply_history_retention(batch_size=1)
+        assert stats == {'origins': 2, 'removed': 3, 'converted': 2}
+        # Retained deltas are converted before the items they rely on are removed
+        assert operations == [
+            ('convert', (1, 3)), ('delete', [(1, 1)]), ('delete', [(1, 2)]),
+            ('convert', (2, 2)), ('delete', [(2, 1)])]
+
+    def test_rebuild_collection_at(self):
+        class FakeCursor(list):
+            def sort(self, keys):
+                return FakeCursor(sorted(self, key=lambda i: [i[k] for k, _ in keys]))
+
+        class FakeHistory:
+            items = []
+
+            @classmethod
+            def _get_collection(cls):
+                return cls
+
+            @classmethod
+            def find(cls, query, projection):
+                return FakeCursor(
+                    i for i in cls.items for q in query['$or']
+                    if i['origin'] == q['origin'] and
+                    q['version']['$gte'] <= i['version'] <= q['version']['$lte'])
+
+        def item(origin, version, content=None, delta=None):
+            return {'origin': origin, 'version': version,
+                    'content': json.dumps(content) if content is not None else None,
+                    'delta': json.dumps(delta) if delta is not None else None}
+
+        FakeHistory.items = [
+            item(1, 1, content={'a': 1}),
+            item(1, 2, delta=[['set', ['a'], 2]]),
+            item(1, 3, content={'a': 3}),
+            item(1, 4, delta=[['set', ['b'], 4]]),
+            item(1, 5, delta=[['del', ['b']]]),
+            item(2, 1, content={'x': 1}),
+            item(2, 2, delta=[['set', ['y'], 2]]),
+        ]
+        states = [{'_id': 1, 'snapshot': 3, 'version': 4},
+                  {'_id': 2, 'snapshot': 1, 'version': 2}]
+        contents = list(HistorizedDocument._rebuild_history_contents(FakeHistory, states))
+        assert contents == [{'a': 3, 'b': 4}, {'x': 1, 'y': 2}]
+
+    def test_fill_history_contents(self, monkeypatch):
+        rebuilt = []
+
+        def get_origin_history_content(cls, origin, version):
+            rebuilt.append((origin, version))
+            return {'a': 2}
+
+        monkeypatch.setattr(HistorizedDocument, 'get_origin_history_content',
+                            classmethod(get_origin_history_content))
+
+        def item(version, content=None, delta=None):
+            return SimpleNamespace(
+                version=version, content=json.dumps(content) if content is not None else None,
+                delta=json.dumps(delta) if delta is not None else None)
+
+        items = [
+            item(2, delta=[['set', ['a'], 2]]),
+            item(3, delta=[['set', ['b'], 3]]),
+            item(4, content={'a': 4}),
+            item(5, delta=[['del', ['a']]]),
+            item(6),
+            item(8, delta=[['set', ['c'], 8]]),
+        ]
+        HistorizedDocument.fill_history_contents(1, items)
+        assert [json.loads(i.content) if i.content else None for i in items] == [
+            {'a': 2}, {'a': 2, 'b': 3}, {'a': 4}, {}, None, {'a': 2}]
+        # Only the items not following a known content are rebuilt
+        assert rebuilt == [(1, 2), (1, 8)]
+
+
+BulkResult = namedtuple('BulkResult', ('matched_count', ))
+
+
+class FakeCollection:
+
+    """Mongo collection handling ``bulk_write`` with a unique ``name`` index"""
+
+    def __init__(self, *sons):
+        self.sons = {son['_id']: dict(son) for son in sons}
+        self._ids = itertools.count(100)
+
+    @staticmethod
+    def _match(son, query):
+        return all(son.get(key) == value for key, value in query.items())
+
+    def bulk_write(self, requests, ordered=True):
+        matched = 0
+        errors = []
+        for index, request in enumerate(requests):
+            if isinstance(request, InsertOne):
+                son = request._doc
+                if any(s['name'] == son['name'] for s in self.sons.values()):
+                    errors.append({'index': index, 'code': 11000})
+                    continue
+                son.setdefault('_id', next(self._ids))
+                self.sons[son['_id']] = dict(son)
+            else:
+                son = self.sons.get(request._filter['_id'])
+                if son and self._match(son, request._filter):
+                    matched += 1
+                    son.update(request._doc.get('$set', {}))
+        if errors:
+            raise BulkWriteError({'nMatched': matched, 'writeErrors': errors})
+        return BulkResult(matched)
+
+    def find(self, query, projection=None):
+        return [son for son in self.sons.values()
+                if any(self._match(son, q) for q in query['$or'])]
+
+
+class BulkItem:
+
+    def __init__(self, pk, name, doc_version=1):
+        self.pk = pk
+        self.name = name
+        self.doc_version = doc_version
+        self.doc_updated = datetime(2016, 1, 1)
+        self._created = not pk
+        self.cleared = False
+
+    def validate(self):
+        pass
+
+    def _delta(self):
+        return {'name': self.name, 'doc_version': self.doc_version,
+                'doc_updated': self.doc_updated}, {}
+
+    def to_mongo(self):
+        return {'name': self.name, 'doc_version': self.doc_version,
+                'doc_updated': self.doc_updated}
+
+    def _clear_changed_fields(self):
+        self.cleared = True
+
+
+class BulkDocument(VersionedDocument):
+
+    meta = {'collection': 'bulk_document'}
+    fake_collection = None
+    post_saved = []
+
+    @classmethod
+    def _get_collection(cls):
+        return cls.fake_collection
+
+    @classmethod
+    def _bulk_post_save(cls, documents, created):
+        cls.post_saved.extend((d, created) for d in documents)
+
+
+class TestBulkSave:
+
+    def setup_method(self, method):
+        BulkDocument.post_saved = []
+
+    def test_concurrent_save_same_version(self):
+        # Another writer already saved the document from the same version
+        BulkDocument.fake_collection = FakeCollection(
+            {'_id': 1, 'name': 'other', 'doc_version': 2, 'doc_updated': datetime(2016, 1, 2)},
+            {'_id': 2, 'name': 'b', 'doc_version': 1, 'doc_updated': datetime(2016, 1, 1)})
+        conflicting = BulkItem(1, 'mine')
+        ok = BulkItem(2, 'b2')
+        failed = BulkDocument.bulk_save([conflicting, ok])
+        assert failed == [conflicting]
+        assert conflicting.doc_version == 1 and not conflicting.cleared
+        assert ok.doc_version == 2 and ok.cleared
+        assert BulkDocument.post_saved == [(ok, False)]
+        assert BulkDocument.fake_collection.sons[1]['name'] == 'other'
+
+    def test_write_errors(self):
+        BulkDocument.fake_collection = FakeCollection(
+            {'_id': 1, 'name': 'a', 'doc_version': 1, 'doc_updated': datetime(2016, 1, 1)})
+        duplicate = BulkItem(None, 'a')
+        inserted = BulkItem(None, 'c')
+        updated = BulkItem(1, 'a2')
+        with pytest.raises(BulkWriteError):
+            BulkDocument.bulk_save([duplicate, inserted, updated])
+        assert duplicate.pk is None and not duplicate.cleared
+        assert inserted.pk == 100 and inserted.cleared
+        assert updated.doc_version == 2 and updated.cleared
+        assert BulkDocument.post_saved == [(inserted, True), (updated, False)]
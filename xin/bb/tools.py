@@ -4,7 +4,7 @@ class PaginationError(Exception):
 
 def list_to_pagination(schema, data, page=1, per_page=20, **kwargs):
     total = kwargs.pop('total', len(data))
-    return {
+    pagination = {
         '_items': data,
         '_meta': {
             'page': page,
@@ -12,6 +12,13 @@ def list_to_pagination(schema, data, page=1, per_page=20, **kwargs):
             'total': total
         }
     }
+    next_cursor = kwargs.pop('next_cursor', None)
+    if next_cursor:
+        pagination['_meta']['next_cursor'] = next_cursor
+    facets = kwargs.pop('facets', None)
+    if facets is not None:
+        pagination['_meta']['facets'] = facets
+    return pagination
 
 
 def paginate(schema, queryset, page=1, per_page=20):
@@ -1,4 +1,4 @@
-from flask import url_for
+from flask import url_for, request
 from collections import namedtuple
 from bson import ObjectId
 
@@ -58,6 +58,7 @@ def history_api_factory(origin_cls):
             item = history_cls.objects.get_or_404(id=item_id)
             if str(item.origin.id) != origin_id:
                 abort(404)
+            origin_cls.fill_history_contents(item.origin.id, [item])
             return HistorySchema().dump(item).data
 
     class HistoryListAPI(CoreResource):
@@ -65,9 +66,26 @@ def history_api_factory(origin_cls):
         def get(self, origin_id):
             page, per_page = get_pagination_urlargs()
             origin_id = convert_id(origin_cls.id, origin_id)
-            items = history_cls.objects(
-                origin=origin_id).paginate(page=page, per_page=per_page)
             links = {'origin': url_for(endpoint_origin, item_id=origin_id)}
+            after_version = request.args.get('after_version')
+            if after_version is not None:
+                # Keyset pagination, cheap even for long histories
+                try:
+                    after_version = int(after_version)
+                except ValueError:
+                    abort(400, after_version='Invalid after_version value type')
+                items = origin_cls.get_origin_history_page(
+                    origin_id, after_version=after_version, limit=per_page)
+                origin_cls.fill_history_contents(origin_id, items)
+                schema = HistorySchema()
+                meta = {'per_page': per_page}
+                if len(items) == per_page:
+                    meta['next_after_version'] = items[-1].version
+                return {'_items': [schema.dump(item).data for item in items],
+                        '_meta': meta, '_links': links}
+            items = history_cls.objects(origin=origin_id).order_by(
+                'version').paginate(page=page, per_page=per_page)
+            origin_cls.fill_history_contents(origin_id, items.items)
             route = url_for(endpoint_list, origin_id=origin_id)
             return view_util.PaginationSerializer(HistorySchema(), route).dump(
                 items, links=links).data
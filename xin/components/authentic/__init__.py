@@ -1,4 +1,7 @@
-from .authentic import AuthenticSession
+"""
+Authentic user authenticator
 
-
-__all__ = ('AuthenticSession', )
+The WAMP component is :class:`xin.components.authentic.authentic.AuthenticSession`.
+It is not imported here: the config is read from the environment on import,
+which the benchmark and the tests must be able to set up beforehand.
+"""
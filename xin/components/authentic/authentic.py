@@ -5,17 +5,26 @@ from twisted.web.server import Site
 from twisted.internet.defer import inlineCallbacks, returnValue
 from datetime import datetime
 
-from .config import LISTEN_PORT, RETRIEVE_USER_RPC
+from .config import (LISTEN_PORT, RETRIEVE_USER_RPC, USER_CHANGED_TOPIC,
+                     USER_CACHE_SIZE, USER_CACHE_TTL)
+from .cache import UserCache
 from .rest import rest_api_factory
-from .tools import decode_token
+from .tools import decode_token, revoke_token, token_cache
 
 
 class AuthenticSession(ApplicationSession):
 
+    @inlineCallbacks
     def onJoin(self, details):
 
+        self.user_cache = UserCache(lambda login: self.call(RETRIEVE_USER_RPC, login),
+                                    max_entries=USER_CACHE_SIZE, ttl=USER_CACHE_TTL)
+        if USER_CHANGED_TOPIC:
+            # Event published with the login of the modified user
+            yield self.subscribe(self.user_cache.invalidate, USER_CHANGED_TOPIC)
+
         rest_app = rest_api_factory(self)
-        reactor.listenTCP(LISTEN_PORT, Site(rest_app.resource()))
+        self.rest_port = reactor.listenTCP(LISTEN_PORT, Site(rest_app.resource()))
 
         @inlineCallbacks
         def authenticate(realm, login, details):
@@ -26,7 +35,7 @@ class AuthenticSession(ApplicationSession):
                     "could not authenticate session - invalid token"
                     " '{}' for user {}".format(token, login))
                 raise ApplicationError('Invalid token')
-            user = yield self.call(RETRIEVE_USER_RPC, login)
+            user = yield self.user_cache.get(login)
             if not user:
                 raise ApplicationError("xin.authentic.no_such_user",
                     "could not authenticate session - no such user {}".format(login))
@@ -35,7 +44,16 @@ class AuthenticSession(ApplicationSession):
                   "authid='{}', ticket='{}'".format(realm, login, details))
             returnValue(user.get('role'))
 
-        return self.register(authenticate, 'xin.authentic.authenticate')
+        def stats():
+            return {'user_cache': self.user_cache.stats(),
+                    'hashing_pool': rest_app.hashing_pool.stats(),
+                    'token_cache': token_cache.stats(),
+                    'login_rate_limit': rest_app.login_limiter.stats(),
+                    'ip_rate_limit': rest_app.ip_limiter.stats()}
+
+        yield self.register(authenticate, 'xin.authentic.authenticate')
+        yield self.register(revoke_token, 'xin.authentic.revoke_token')
+        yield self.register(stats, 'xin.authentic.stats')
 
 
 if __name__ == "__main__":
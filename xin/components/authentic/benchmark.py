@@ -0,0 +1,244 @@
+"""
+Load test of the authentic component, without router nor user service
+
+Starts the REST API on a local port with an in-process stubbed WAMP
+session answering the user RPCs, then drives ``/login``, ``/signin`` and
+``xin.authentic.authenticate`` at the given concurrencies::
+
+    python -m xin.components.authentic.benchmark --requests 1000 --concurrency 50 200
+
+Reports for each scenario the throughput, the p50/p95/p99 latencies, the
+responses by status and the time the reactor was blocked.
+"""
+import io
+import os
+import json
+import time
+import argparse
+import itertools
+from collections import Counter
+
+# Must be set before loading the config
+os.environ.setdefault('AUTHENTIC_REGISTER_USER_RPC', 'bench.register_user')
+os.environ.setdefault('AUTHENTIC_RETRIEVE_USER_RPC', 'bench.retrieve_user')
+os.environ.setdefault('AUTHENTIC_LISTEN_PORT', '0')
+os.environ.setdefault('AUTHENTIC_LOGIN_RATE_LIMIT', str(10 ** 9))
+os.environ.setdefault('AUTHENTIC_IP_RATE_LIMIT', str(10 ** 9))
+
+from twisted.internet import reactor, task  # noqa
+from twisted.internet.defer import inlineCallbacks, returnValue, maybeDeferred, succeed, gatherResults  # noqa
+from twisted.web.client import Agent, HTTPConnectionPool, FileBodyProducer, readBody  # noqa
+from twisted.web.http_headers import Headers  # noqa
+
+from .authentic import AuthenticSession  # noqa
+from .config import RETRIEVE_USER_RPC, REGISTER_USER_RPC  # noqa
+from .tools import encrypt_password  # noqa
+from .rest import _create_token  # noqa
+
+
+class StubSession(AuthenticSession):
+
+    """
+    :class:`AuthenticSession` calling and registering procedures in
+    process, with the user RPCs backed by a dict
+    """
+
+    def __init__(self, users, rpc_latency=0):
+        super().__init__()
+        self.users = users
+        self.rpc_latency = rpc_latency
+        self.procedures = {RETRIEVE_USER_RPC: self._retrieve_user,
+                           REGISTER_USER_RPC: self._register_user}
+
+    def _retrieve_user(self, login):
+        return self.users.get(login)
+
+    def _register_user(self, login, hashed_password, body):
+        if login in self.users:
+            return None
+        self.users[login] = {'login': login, 'hashed_password': hashed_password,
+                             'role': 'user'}
+        return self.users[login]
+
+    def register(self, endpoint, procedure, *args, **kwargs):
+        self.procedures[procedure] = endpoint
+        return succeed(None)
+
+    def subscribe(self, handler, topic, *args, **kwargs):
+        return succeed(None)
+
+    def call(self, procedure, *args, **kwargs):
+        if self.rpc_latency:
+            return task.deferLater(reactor, self.rpc_latency, self.procedures[procedure],
+                                   *args, **kwargs)
+        return maybeDeferred(self.procedures[procedure], *args, **kwargs)
+
+
+class ReactorLagMonitor:
+
+    """
+    Measure how long the reactor is blocked, based on the delay of a
+    ``LoopingCall`` ticking every ``interval`` seconds
+    """
+
+    def __init__(self, interval=0.01):
+        self.interval = interval
+        self._loop = task.LoopingCall(self._tick)
+        self.reset()
+
+    def reset(self):
+        self.blocked = 0
+        self.max_lag = 0
+        self._last = time.monotonic()
+
+    def _tick(self):
+        now = time.monotonic()
+        lag = now - self._last - self.interval
+        if lag > 0:
+            self.blocked += lag
+            self.max_lag = max(self.max_lag, lag)
+        self._last = now
+
+    def start(self):
+        self.reset()
+        self._loop.start(self.interval, now=False)
+
+    def stop(self):
+        self._loop.stop()
+
+
+def percentile(values, p):
+    if not values:
+        return 0
+    values = sorted(values)
+    return values[max(0, int(round(p / 100 * len(values))) - 1)]
+
+
+@inlineCallbacks
+def run_scenario(request, total, concurrency, monitor):
+    """
+    Call ``request(i)`` (returning a Deferred of a status) ``total`` times
+    from ``concurrency`` concurrent workers
+    """
+    latencies = []
+    statuses = Counter()
+    counter = itertools.count()
+
+    @inlineCallbacks
+    def worker():
+        for i in counter:
+            if i >= total:
+                return
+            start = time.monotonic()
+            try:
+                status = yield request(i)
+            except Exception as exc:
+                status = type(exc).__name__
+            latencies.append(time.monotonic() - start)
+            statuses[status] += 1
+
+    monitor.start()
+    start = time.monotonic()
+    yield gatherResults([worker() for _ in range(concurrency)])
+    elapsed = time.monotonic() - start
+    monitor.stop()
+    returnValue({
+        'requests': total,
+        'concurrency': concurrency,
+        'throughput': total / elapsed if elapsed else 0,
+        'p50': percentile(latencies, 50),
+        'p95': percentile(latencies, 95),
+        'p99': percentile(latencies, 99),
+        'statuses': dict(statuses),
+        'blocked': monitor.blocked,
+        'blocked_ratio': monitor.blocked / elapsed if elapsed else 0,
+        'max_lag': monitor.max_lag
+    })
+
+
+def print_report(name, report):
+    print('[BENCH] %-12s c=%-4s %6.1f req/s  p50=%7.1fms p95=%7.1fms p99=%7.1fms  '
+          'reactor blocked %5.1fs (%3.0f%%, max %.0fms)  %s' % (
+              name, report['concurrency'], report['throughput'], report['p50'] * 1000,
+              report['p95'] * 1000, report['p99'] * 1000, report['blocked'],
+              report['blocked_ratio'] * 100, report['max_lag'] * 1000,
+              ', '.join('%s: %s' % item for item in sorted(report['statuses'].items()))))
+
+
+@inlineCallbacks
+def run_benchmark(args):
+    print('[BENCH] Creating %s users...' % args.users)
+    hashed_password = encrypt_password('password')
+    users = {'user-%s' % i: {'login': 'user-%s' % i, 'hashed_password': hashed_password,
+                             'role': 'user'}
+             for i in range(args.users)}
+    session = StubSession(users, rpc_latency=args.rpc_latency / 1000)
+    yield session.onJoin(None)
+    url = 'http://127.0.0.1:%s' % session.rest_port.getHost().port
+    pool = HTTPConnectionPool(reactor)
+    pool.maxPersistentPerHost = max(args.concurrency)
+    agent = Agent(reactor, pool=pool)
+    authenticate = session.procedures['xin.authentic.authenticate']
+    tokens = {login: _create_token(login) for login in users}
+    signin_ids = itertools.count()
+
+    @inlineCallbacks
+    def post(path, body):
+        response = yield agent.request(
+            b'POST', (url + path).encode(), Headers({b'Content-Type': [b'application/json']}),
+            FileBodyProducer(io.BytesIO(json.dumps(body).encode())))
+        yield readBody(response)
+        returnValue(response.code)
+
+    def login(i):
+        return post('/login', {'login': 'user-%s' % (i % args.users), 'password': 'password'})
+
+    def signin(i):
+        return post('/signin', {'login': 'new-user-%s' % next(signin_ids),
+                                'password': 'password'})
+
+    @inlineCallbacks
+    def authenticate_session(i):
+        login = 'user-%s' % (i % args.users)
+        yield authenticate('realm1', login, {'ticket': tokens[login]})
+        returnValue('ok')
+
+    scenarios = {'login': login, 'signin': signin, 'authenticate': authenticate_session}
+    monitor = ReactorLagMonitor()
+    reports = {}
+    for name in args.scenarios:
+        for concurrency in args.concurrency:
+            report = yield run_scenario(scenarios[name], args.requests, concurrency, monitor)
+            print_report(name, report)
+            reports['%s-%s' % (name, concurrency)] = report
+    yield pool.closeCachedConnections()
+    yield session.rest_port.stopListening()
+    returnValue(reports)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--scenarios', nargs='+', default=['login', 'signin', 'authenticate'],
+                        choices=['login', 'signin', 'authenticate'])
+    parser.add_argument('--requests', type=int, default=500, help='requests per scenario')
+    parser.add_argument('--concurrency', type=int, nargs='+', default=[50, 200])
+    parser.add_argument('--users', type=int, default=100, help='number of existing users')
+    parser.add_argument('--rpc-latency', type=float, default=0,
+                        help='simulated latency (in ms) of the user RPCs')
+    parser.add_argument('--json', help='also write the reports to this file')
+    args = parser.parse_args(argv)
+
+    @inlineCallbacks
+    def run(reactor):
+        reports = yield run_benchmark(args)
+        if args.json:
+            with open(args.json, 'w') as fd:
+                json.dump(reports, fd, indent=2)
+
+    # Exits with 1 (after printing the traceback) if the benchmark fails,
+    # even before the reactor is running
+    task.react(run)
+
+
+if __name__ == '__main__':
+    main()
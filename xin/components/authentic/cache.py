@@ -0,0 +1,155 @@
+import time
+from collections import OrderedDict
+from twisted.internet.defer import Deferred, maybeDeferred, succeed
+from twisted.python.failure import Failure
+
+
+class UserCache:
+
+    """
+    Bounded TTL cache of login -> user summary (login and role)
+
+    Concurrent lookups of the same login share a single call to
+    ``retrieve``. Unknown users are not cached, so they can authenticate
+    as soon as they are registered.
+    """
+
+    def __init__(self, retrieve, max_entries=10000, ttl=60):
+        """
+        :param retrieve: function taking a login and returning the user
+        (or a Deferred of it), None if no such user
+        :param max_entries: max number of cached users, least recently
+        used ones are dropped first
+        :param ttl: lifetime (in seconds) of the cached users
+        """
+        self._retrieve = retrieve
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._in_flight = {}
+        self._invalidated_in_flight = set()
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.invalidations = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, login):
+        """Return a Deferred of the user summary, None if no such user"""
+        entry = self._entries.get(login)
+        if entry and entry[0] > time.monotonic():
+            self._entries.move_to_end(login)
+            self.hits += 1
+            return succeed(entry[1])
+        self.misses += 1
+        waiting = self._in_flight.get(login)
+        if waiting is not None:
+            self.coalesced += 1
+            d = Deferred()
+            waiting.append(d)
+            return d
+        self._in_flight[login] = []
+        d = maybeDeferred(self._retrieve, login)
+        d.addBoth(self._on_retrieved, login)
+        return d
+
+    def _on_retrieved(self, result, login):
+        waiting = self._in_flight.pop(login)
+        if isinstance(result, Failure):
+            self._invalidated_in_flight.discard(login)
+            for d in waiting:
+                d.errback(result)
+            return result
+        summary = {'login': login, 'role': result.get('role')} if result else None
+        if login in self._invalidated_in_flight:
+            # User changed while being retrieved, result may be outdated
+            self._invalidated_in_flight.discard(login)
+        elif summary:
+            self._entries.pop(login, None)
+            self._entries[login] = (time.monotonic() + self.ttl, summary)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        for d in waiting:
+            d.callback(summary)
+        return summary
+
+    def invalidate(self, login):
+        """Drop the cached user (e.g. on a user changed event)"""
+        self.invalidations += 1
+        self._entries.pop(login, None)
+        if login in self._in_flight:
+            self._invalidated_in_flight.add(login)
+
+    def clear(self):
+        self.invalidations += 1
+        self._entries.clear()
+        self._invalidated_in_flight.update(self._in_flight)
+
+    def stats(self):
+        return {'size': len(self._entries), 'hits': self.hits, 'misses': self.misses,
+                'coalesced': self.coalesced, 'invalidations': self.invalidations}
+
+
+class TokenCache:
+
+    """
+    Bounded cache of the verified tokens (keyed by digest), each entry
+    expiring along with its token, and list of the revoked tokens
+    """
+
+    def __init__(self, max_entries=100000, purge_interval=60):
+        self.max_entries = max_entries
+        self.purge_interval = purge_interval
+        self._entries = OrderedDict()
+        self._revoked = {}
+        self._next_purge = 0
+        self.hits = 0
+        self.misses = 0
+        self.revocations = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, digest, now):
+        """Return the cached payload of the token, None if missing or expired"""
+        entry = self._entries.get(digest)
+        if entry is None:
+            self.misses += 1
+            return None
+        if entry[0] <= now:
+            del self._entries[digest]
+            self.misses += 1
+            return None
+        self._entries.move_to_end(digest)
+        self.hits += 1
+        return entry[2]
+
+    def set(self, digest, exp, kid, payload):
+        self._entries.pop(digest, None)
+        self._entries[digest] = (exp, kid, payload)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def revoke(self, digest, exp, now):
+        """Reject the token until its expiration"""
+        self.revocations += 1
+        self._entries.pop(digest, None)
+        self._revoked[digest] = exp
+        if now >= self._next_purge:
+            # Expired tokens are rejected anyway
+            self._next_purge = now + self.purge_interval
+            self._revoked = {d: e for d, e in self._revoked.items() if e > now}
+
+    def is_revoked(self, digest):
+        return digest in self._revoked
+
+    def discard_key(self, kid):
+        """Drop the tokens signed by the given key"""
+        for digest in [d for d, entry in self._entries.items() if entry[1] == kid]:
+            del self._entries[digest]
+
+    def stats(self):
+        return {'size': len(self._entries), 'hits': self.hits, 'misses': self.misses,
+                'revoked': len(self._revoked)}
@@ -2,8 +2,23 @@ from os import environ
 
 
 SECRET_KEY = environ.get('SECRET_KEY', 'secret_for_test_only!')
+# Keys with id, as "<key id>:<key>,<key id>:<key>", tokens are signed
+# with SECRET_KEY_ID's one (or SECRET_KEY without key id if not set)
+SECRET_KEYS = dict(key.split(':', 1) for key in
+                   environ.get('AUTHENTIC_SECRET_KEYS', '').split(',') if key)
+SECRET_KEY_ID = environ.get('AUTHENTIC_SECRET_KEY_ID')
 REGISTER_USER_RPC = environ['AUTHENTIC_REGISTER_USER_RPC']
 RETRIEVE_USER_RPC = environ['AUTHENTIC_RETRIEVE_USER_RPC']
-LISTEN_PORT = environ.get('AUTHENTIC_LISTEN_PORT', 8081)
-TOKEN_VALIDITY = environ.get('AUTHENTIC_TOKEN_VALIDITY', 7 * 24 * 3600)
+LISTEN_PORT = int(environ.get('AUTHENTIC_LISTEN_PORT', 8081))
+TOKEN_VALIDITY = int(environ.get('AUTHENTIC_TOKEN_VALIDITY', 7 * 24 * 3600))
 CORS_ORIGIN = environ.get('AUTHENTIC_CORS_ORIGIN', '*').encode()
+USER_CHANGED_TOPIC = environ.get('AUTHENTIC_USER_CHANGED_TOPIC')
+USER_CACHE_SIZE = int(environ.get('AUTHENTIC_USER_CACHE_SIZE', 10000))
+USER_CACHE_TTL = float(environ.get('AUTHENTIC_USER_CACHE_TTL', 60))
+HASHING_THREADS = int(environ.get('AUTHENTIC_HASHING_THREADS', 4))
+HASHING_QUEUE_SIZE = int(environ.get('AUTHENTIC_HASHING_QUEUE_SIZE', 64))
+TOKEN_CACHE_SIZE = int(environ.get('AUTHENTIC_TOKEN_CACHE_SIZE', 100000))
+# Max requests per minute
+LOGIN_RATE_LIMIT = int(environ.get('AUTHENTIC_LOGIN_RATE_LIMIT', 10))
+IP_RATE_LIMIT = int(environ.get('AUTHENTIC_IP_RATE_LIMIT', 60))
+RATE_LIMIT_SLOTS = int(environ.get('AUTHENTIC_RATE_LIMIT_SLOTS', 2 ** 20))
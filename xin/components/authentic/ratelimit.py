@@ -0,0 +1,64 @@
+import time
+from array import array
+
+
+class RateLimiter:
+
+    """
+    Token bucket rate limiter with a fixed memory footprint whatever the
+    number of keys
+
+    Each key gets ``burst`` tokens, refilled continuously at ``rate`` tokens
+    per second (i.e. at most ``burst`` requests over any sliding window of
+    ``burst / rate`` seconds), a request consumes a token.
+
+    Keys are hashed into two of the ``slots`` buckets, both consumed by a
+    request. The tokens left for a key are estimated as the max of its
+    buckets: a key is only limited if both its buckets are empty, i.e.
+    keys sharing a single bucket don't block each other.
+    """
+
+    def __init__(self, rate, burst, slots=2 ** 20):
+        """
+        :param rate: tokens refilled per second
+        :param burst: max tokens of a bucket
+        :param slots: number of buckets
+        """
+        self.rate = rate
+        self.burst = burst
+        self.slots = slots
+        self._tokens = array('f', [burst]) * slots
+        self._updated = array('d', [0]) * slots
+        self.allowed = 0
+        self.rejected = 0
+
+    def _get_slots(self, key):
+        h = hash(key) & 0xFFFFFFFFFFFFFFFF
+        return h % self.slots, (h // self.slots) % self.slots
+
+    def _get_tokens(self, slots, now):
+        return [min(self.burst, self._tokens[s] + (now - self._updated[s]) * self.rate)
+                for s in slots]
+
+    def allow(self, key, now=None):
+        """Consume a token of the key, return False if none is left"""
+        now = time.monotonic() if now is None else now
+        slots = self._get_slots(key)
+        tokens = self._get_tokens(slots, now)
+        if max(tokens) < 1:
+            self.rejected += 1
+            return False
+        for s, t in zip(slots, tokens):
+            self._tokens[s] = max(0, t - 1)
+            self._updated[s] = now
+        self.allowed += 1
+        return True
+
+    def retry_after(self, key, now=None):
+        """Seconds before the next token of the key"""
+        now = time.monotonic() if now is None else now
+        tokens = max(self._get_tokens(self._get_slots(key), now))
+        return max(0, (1 - tokens) / self.rate)
+
+    def stats(self):
+        return {'allowed': self.allowed, 'rejected': self.rejected}
@@ -3,14 +3,24 @@ from datetime import datetime
 from klein import Klein
 from twisted.internet.defer import inlineCallbacks, returnValue
 
-from .tools import encrypt_password, verify_password, encode_token
-from .config import RETRIEVE_USER_RPC, REGISTER_USER_RPC, TOKEN_VALIDITY, CORS_ORIGIN
+from .tools import HashingPool, HashingPoolFull, encode_token
+from .ratelimit import RateLimiter
+from .config import (RETRIEVE_USER_RPC, REGISTER_USER_RPC, TOKEN_VALIDITY, CORS_ORIGIN,
+                     HASHING_THREADS, HASHING_QUEUE_SIZE, LOGIN_RATE_LIMIT, IP_RATE_LIMIT,
+                     RATE_LIMIT_SLOTS)
 
 
 class Response400(Exception):
     pass
 
 
+class Response429(Exception):
+
+    def __init__(self, retry_after):
+        super().__init__('Too many requests.')
+        self.retry_after = retry_after
+
+
 def _retreive_content(request):
     try:
         body = json.loads(request.content.read().decode())
@@ -34,25 +44,53 @@ def _create_token(login):
     return encode_token({'login': login, 'exp': exp})
 
 
-def rest_api_factory(wamp_session):
+def _check_rate_limit(limiter, key):
+    if not limiter.allow(key):
+        raise Response429(limiter.retry_after(key))
+
+
+def rest_api_factory(wamp_session, hashing_pool=None, login_limiter=None, ip_limiter=None):
 
     klein_app = Klein()
+    klein_app.hashing_pool = hashing_pool = hashing_pool or HashingPool(
+        max_threads=HASHING_THREADS, max_pending=HASHING_QUEUE_SIZE)
+    # Checked before any user retrieval or hashing
+    klein_app.login_limiter = login_limiter = login_limiter or RateLimiter(
+        rate=LOGIN_RATE_LIMIT / 60, burst=LOGIN_RATE_LIMIT, slots=RATE_LIMIT_SLOTS)
+    klein_app.ip_limiter = ip_limiter = ip_limiter or RateLimiter(
+        rate=IP_RATE_LIMIT / 60, burst=IP_RATE_LIMIT, slots=RATE_LIMIT_SLOTS)
 
     @klein_app.handle_errors(Response400)
     def response_400(request, failure):
         request.setResponseCode(400)
         return json.dumps({'message': str(failure.value)})
 
+    @klein_app.handle_errors(Response429)
+    def response_429(request, failure):
+        request.setResponseCode(429)
+        request.setHeader(b'Retry-After', str(int(failure.value.retry_after) + 1).encode())
+        return json.dumps({'message': str(failure.value)})
+
+    @klein_app.handle_errors(HashingPoolFull)
+    def response_503(request, failure):
+        request.setResponseCode(503)
+        request.setHeader(b'Retry-After', b'1')
+        return json.dumps({'message': 'Server busy, retry later.'})
+
     @klein_app.route('/login', methods=['POST', 'OPTIONS'])
     @inlineCallbacks
     def login(request):
         _set_cors_headers(request)
         if request.method == b'OPTIONS':
             return
+        _check_rate_limit(ip_limiter, request.getClientIP())
         login, password, body = _retreive_content(request)
+        _check_rate_limit(login_limiter, login)
         user = yield wamp_session.call(RETRIEVE_USER_RPC, login)
-        if (not user or not user.get('hashed_password') or
-                not verify_password(password, user['hashed_password'])):
+        valid = False
+        if user and user.get('hashed_password'):
+            valid = yield hashing_pool.verify_password(password, user['hashed_password'])
+        if not valid:
             raise Response400('Unknown user or invalid password')
         returnValue(json.dumps({'login': login, 'token': _create_token(login)}))
 
@@ -62,8 +100,9 @@ def rest_api_factory(wamp_session):
         _set_cors_headers(request)
         if request.method == b'OPTIONS':
             return
+        _check_rate_limit(ip_limiter, request.getClientIP())
         login, password, body = _retreive_content(request)
-        hashed_password = encrypt_password(password)
+        hashed_password = yield hashing_pool.encrypt_password(password)
         user = yield wamp_session.call(REGISTER_USER_RPC, login, hashed_password, body)
         if not user:
             raise Response400("Couldn't create user")
@@ -0,0 +1,6 @@
+import os
+
+
+# The config is read from the environment when the modules are imported
+os.environ.setdefault('AUTHENTIC_REGISTER_USER_RPC', 'test.register_user')
+os.environ.setdefault('AUTHENTIC_RETRIEVE_USER_RPC', 'test.retrieve_user')
@@ -0,0 +1,114 @@
+from twisted.internet.defer import Deferred
+
+from ..cache import UserCache, TokenCache
+
+
+class FakeRetrieve:
+
+    def __init__(self):
+        self.calls = []
+
+    def __call__(self, login):
+        d = Deferred()
+        self.calls.append((login, d))
+        return d
+
+
+def _result(d):
+    results = []
+    d.addBoth(results.append)
+    return results[0] if results else None
+
+
+class TestUserCache:
+
+    def test_hit_and_miss(self):
+        retrieve = FakeRetrieve()
+        cache = UserCache(retrieve)
+        d = cache.get('bob')
+        retrieve.calls[0][1].callback({'login': 'bob', 'role': 'admin', 'hashed_password': 'x'})
+        assert _result(d) == {'login': 'bob', 'role': 'admin'}
+        assert _result(cache.get('bob')) == {'login': 'bob', 'role': 'admin'}
+        assert len(retrieve.calls) == 1
+        assert cache.stats() == {'size': 1, 'hits': 1, 'misses': 1, 'coalesced': 0,
+                                 'invalidations': 0}
+
+    def test_coalesce_concurrent_lookups(self):
+        retrieve = FakeRetrieve()
+        cache = UserCache(retrieve)
+        ds = [cache.get('bob') for _ in range(3)]
+        assert len(retrieve.calls) == 1
+        retrieve.calls[0][1].callback({'login': 'bob', 'role': 'user'})
+        assert [_result(d) for d in ds] == [{'login': 'bob', 'role': 'user'}] * 3
+        assert cache.coalesced == 2
+
+    def test_unknown_user_not_cached(self):
+        retrieve = FakeRetrieve()
+        cache = UserCache(retrieve)
+        d = cache.get('bob')
+        retrieve.calls[0][1].callback(None)
+        assert _result(d) is None
+        cache.get('bob')
+        assert len(retrieve.calls) == 2
+
+    def test_invalidate(self):
+        retrieve = FakeRetrieve()
+        cache = UserCache(retrieve)
+        cache.get('bob')
+        # Changed while being retrieved
+        cache.invalidate('bob')
+        retrieve.calls[0][1].callback({'login': 'bob', 'role': 'user'})
+        assert not len(cache)
+        cache.get('bob')
+        retrieve.calls[1][1].callback({'login': 'bob', 'role': 'user'})
+        assert len(cache) == 1
+        cache.invalidate('bob')
+        assert not len(cache)
+
+    def test_ttl_and_max_entries(self):
+        retrieve = FakeRetrieve()
+        cache = UserCache(retrieve, max_entries=2, ttl=0)
+        for login in ('a', 'b', 'c'):
+            cache.get(login)
+            retrieve.calls[-1][1].callback({'login': login, 'role': 'user'})
+        assert len(cache) == 2
+        # Expired
+        cache.get('c')
+        assert len(retrieve.calls) == 4
+
+
+class TestTokenCache:
+
+    def test_expiration(self):
+        cache = TokenCache()
+        cache.set(b'digest', 100, None, {'login': 'bob', 'exp': 100})
+        assert cache.get(b'digest', 99) == {'login': 'bob', 'exp': 100}
+        assert cache.get(b'digest', 100) is None
+        assert not len(cache)
+        assert cache.stats() == {'size': 0, 'hits': 1, 'misses': 1, 'revoked': 0}
+
+    def test_max_entries(self):
+        cache = TokenCache(max_entries=2)
+        for digest in (b'a', b'b', b'c'):
+            cache.set(digest, 100, None, {})
+        assert len(cache) == 2
+        assert cache.get(b'a', 0) is None
+
+    def test_revoke(self):
+        cache = TokenCache(purge_interval=10)
+        cache.set(b'a', 100, None, {})
+        cache.revoke(b'a', 100, now=0)
+        assert cache.get(b'a', 0) is None
+        assert cache.is_revoked(b'a')
+        # Expired revocations are purged
+        cache.revoke(b'b', 200, now=150)
+        assert not cache.is_revoked(b'a')
+        assert cache.is_revoked(b'b')
+
+    def test_discard_key(self):
+        cache = TokenCache()
+        cache.set(b'a', 100, 'old', {})
+        cache.set(b'b', 100, 'new', {})
+        cache.discard_key('old')
+        assert cache.get(b'a', 0) is None
+        assert cache.get(b'b', 0) == {}
@@ -0,0 +1,41 @@
+from ..ratelimit import RateLimiter
+
+
+class SlotsRateLimiter(RateLimiter):
+
+    """Rate limiter with explicit key -> slots mapping"""
+
+    SLOTS = {'a': (0, 1), 'b': (1, 2), 'c': (0, 1)}
+
+    def _get_slots(self, key):
+        return self.SLOTS[key]
+
+
+class TestRateLimiter:
+
+    def test_burst_and_refill(self):
+        limiter = RateLimiter(rate=1 / 6, burst=10, slots=1024)
+        assert [limiter.allow('bob', now=100) for _ in range(12)].count(True) == 10
+        assert limiter.retry_after('bob', now=100) == 6
+        assert not limiter.allow('bob', now=105)
+        assert limiter.allow('bob', now=106)
+        assert limiter.allow('alice', now=106)
+        assert limiter.stats() == {'allowed': 12, 'rejected': 3}
+
+    def test_single_shared_bucket(self):
+        limiter = SlotsRateLimiter(rate=1, burst=3, slots=4)
+        for _ in range(3):
+            assert limiter.allow('a', now=0)
+        assert not limiter.allow('a', now=0)
+        # Shares only one bucket with the throttled key
+        assert limiter.allow('b', now=0)
+        assert limiter.retry_after('b', now=0) == 0
+        # Shares both buckets
+        assert not limiter.allow('c', now=0)
+        assert limiter.retry_after('c', now=0) == 1
+
+    def test_fixed_memory(self):
+        limiter = RateLimiter(rate=1, burst=1, slots=64)
+        for i in range(10000):
+            limiter.allow('user-%s' % i, now=0)
+        assert len(limiter._tokens) == len(limiter._updated) == 64
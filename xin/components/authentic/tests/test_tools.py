@@ -0,0 +1,23 @@
+import time
+
+from ..tools import encode_token, decode_token, revoke_token, token_cache
+
+
+class TestTokens:
+
+    def test_encode_decode(self):
+        payload = {'login': 'bob', 'exp': time.time() + 60}
+        token = encode_token(payload)
+        assert isinstance(token, str)
+        assert decode_token(token) == payload
+        # Second decoding comes from the cache
+        hits = token_cache.hits
+        assert decode_token(token) == payload
+        assert token_cache.hits == hits + 1
+        assert decode_token(token[:-2]) is None
+
+    def test_revoke(self):
+        token = encode_token({'login': 'bob', 'exp': time.time() + 60})
+        assert revoke_token(token)
+        assert decode_token(token) is None
+        assert not revoke_token(token)
@@ -1,7 +1,22 @@
 import jwt
+import time
+import hashlib
 from passlib.apps import custom_app_context as pwd_context
+from twisted.internet import reactor
+from twisted.internet.defer import fail
+from twisted.internet.threads import deferToThreadPool
+from twisted.python.threadpool import ThreadPool
 
-from .config import SECRET_KEY
+from .cache import TokenCache
+from .config import SECRET_KEY, SECRET_KEYS, SECRET_KEY_ID, TOKEN_CACHE_SIZE
+
+
+# Tokens without key id are verified with SECRET_KEY
+_keys = dict(SECRET_KEYS)
+_keys[None] = SECRET_KEY
+assert SECRET_KEY_ID in _keys, 'Unknown AUTHENTIC_SECRET_KEY_ID %s' % SECRET_KEY_ID
+
+token_cache = TokenCache(max_entries=TOKEN_CACHE_SIZE)
 
 
 def encrypt_password(password):
@@ -12,12 +27,112 @@ def verify_password(password, pwd_hash):
     return pwd_context.verify(password, pwd_hash)
 
 
+class HashingPoolFull(Exception):
+    pass
+
+
+class HashingPool:
+
+    """
+    Run the (deliberately slow) password hashing in a bounded thread pool
+    instead of blocking the reactor
+
+    At most ``max_pending`` hashings can be running or queued, others fail
+    right away with :class:`HashingPoolFull`.
+    """
+
+    def __init__(self, max_threads=4, max_pending=64):
+        self.max_pending = max_pending
+        self._pool = ThreadPool(minthreads=0, maxthreads=max_threads,
+                                name='authentic-hashing')
+        self._started = False
+        self.pending = 0
+        self.rejected = 0
+
+    @property
+    def saturated(self):
+        return self.pending >= self.max_pending
+
+    def run(self, func, *args):
+        """Return a Deferred of ``func(*args)`` run in the pool"""
+        if self.saturated:
+            self.rejected += 1
+            return fail(HashingPoolFull())
+        if not self._started:
+            self._started = True
+            self._pool.start()
+            reactor.addSystemEventTrigger('during', 'shutdown', self._pool.stop)
+        self.pending += 1
+        d = deferToThreadPool(reactor, self._pool, func, *args)
+        d.addBoth(self._on_done)
+        return d
+
+    def _on_done(self, result):
+        self.pending -= 1
+        return result
+
+    def encrypt_password(self, password):
+        return self.run(encrypt_password, password)
+
+    def verify_password(self, password, pwd_hash):
+        return self.run(verify_password, password, pwd_hash)
+
+    def stats(self):
+        return {'pending': self.pending, 'rejected': self.rejected}
+
+
 def encode_token(payload):
-    return jwt.encode(payload, SECRET_KEY, algorithm='HS256').decode()
+    if SECRET_KEY_ID is None:
+        token = jwt.encode(payload, SECRET_KEY, algorithm='HS256')
+    else:
+        token = jwt.encode(payload, _keys[SECRET_KEY_ID], algorithm='HS256',
+                           headers={'kid': SECRET_KEY_ID})
+    # PyJWT < 2 returns bytes
+    return token.decode() if isinstance(token, bytes) else token
+
+
+def _token_digest(token):
+    return hashlib.sha256(token.encode()).digest()
 
 
 def decode_token(token):
+    """
+    Return the payload of the token, None if it is invalid, expired or
+    revoked (verified tokens are cached until their expiration)
+    """
+    digest = _token_digest(token)
+    payload = token_cache.get(digest, time.time())
+    if payload is not None:
+        return payload
+    if token_cache.is_revoked(digest):
+        return None
     try:
-        return jwt.decode(token, SECRET_KEY)
+        kid = jwt.get_unverified_header(token).get('kid')
+        key = _keys.get(kid)
+        if key is None:
+            return None
+        payload = jwt.decode(token, key, algorithms=['HS256'])
     except jwt.InvalidTokenError:
         return None
+    if 'exp' in payload:
+        token_cache.set(digest, payload['exp'], kid, payload)
+    return payload
+
+
+def revoke_token(token):
+    """
+    Reject the token from now on (e.g. on logout)
+
+    :return: False if the token was already invalid
+    """
+    payload = decode_token(token)
+    if not payload:
+        return False
+    token_cache.revoke(_token_digest(token), payload.get('exp', float('inf')), time.time())
+    return True
+
+
+def revoke_key(kid):
+    """Reject the tokens signed by the given key (e.g. if compromised)"""
+    _keys.pop(kid, None)
+    token_cache.discard_key(kid)